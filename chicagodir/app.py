@@ -86,6 +86,14 @@ def register_commands(app):
     app.cli.add_command(commands.test)
     app.cli.add_command(commands.lint)
     app.cli.add_command(commands.run_worker)
+    app.cli.add_command(commands.reload_geodata)
+    app.cli.add_command(commands.recalc_successors)
+    app.cli.add_command(commands.inherit_grids)
+    app.cli.add_command(commands.refresh_geometry)
+    app.cli.add_command(commands.rebuild_tags)
+    app.cli.add_command(commands.rebuild_lineage)
+    app.cli.add_command(commands.rebuild_professions)
+    app.cli.add_command(commands.rematch_streets)
 
 
 def configure_logger(app):
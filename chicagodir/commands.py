@@ -1,13 +1,18 @@
 # -*- coding: utf-8 -*-
 """Click commands."""
+import multiprocessing
 import os
+import signal
 from glob import glob
 from subprocess import call
 
 import click
 import redis
 from environs import Env
-from rq import Connection, Worker
+from flask.cli import with_appcontext
+from rq import Connection
+
+from chicagodir.jobs import QUEUES
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 PROJECT_ROOT = os.path.join(HERE, os.pardir)
@@ -18,7 +23,6 @@ env = Env()
 env.read_env()
 
 REDIS_URL = env.str("REDIS_URL", default="redis://redis:6379/0")
-QUEUES = ["default"]
 
 
 @click.command()
@@ -75,19 +79,191 @@ def lint(fix_imports, check):
     execute_tool("Checking code style", "flake8")
 
 
-@click.command("run_worker")
-def run_worker():
-    """Run the redis worker."""
-    # redis stuff
-
-    redis_connection = redis.from_url(REDIS_URL)
-
+def work(queues):
+    """Run one worker on the queues, in priority order, with an app context."""
     # import this, because it's slow to import
     from chicagodir.app import create_app
+    from chicagodir.worker import GeodataWorker
 
     app = create_app()
     app.app_context().push()
 
-    with Connection(redis_connection):
-        worker = Worker(QUEUES)
-        worker.work()
+    with Connection(redis.from_url(REDIS_URL)):
+        worker = GeodataWorker(queues)
+        # the scheduler releases the debounced jobs of chicagodir.jobs.dispatch
+        worker.work(with_scheduler=True)
+
+
+@click.command("run_worker")
+@click.option(
+    "-q",
+    "--queues",
+    multiple=True,
+    help="Queues to work on, highest priority first, as one comma-separated "
+    "list or several options [default: {}]".format(",".join(QUEUES)),
+)
+@click.option(
+    "-n",
+    "--processes",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of worker processes",
+)
+def run_worker(queues, processes):
+    """Run the redis workers.
+
+    Each worker takes the next job from the first of its queues that has
+    one, so fast metadata jobs go ahead of map rendering; with several
+    processes, a long render does not hold them up either.
+    """
+    queues = [name for value in queues for name in value.split(",") if name] or QUEUES
+    if processes == 1:
+        work(queues)
+        return
+
+    workers = [
+        multiprocessing.Process(target=work, args=(queues,), name=f"worker-{n}")
+        for n in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def stop(signum, frame):
+        # workers finish their current job and stop
+        for worker in workers:
+            worker.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    for worker in workers:
+        worker.join()
+
+
+@click.command("reload_geodata")
+@with_appcontext
+def reload_geodata():
+    """Have workers reload community areas and city limits, after they change.
+
+    The geodata generation is kept in the cache, so this needs one shared
+    with the workers, such as Redis.
+    """
+    from flask_caching.backends import NullCache, SimpleCache
+
+    from chicagodir.extensions import cache
+    from chicagodir.streets.geodata import invalidate_geodata
+
+    if isinstance(cache.cache, (NullCache, SimpleCache)):
+        raise click.ClickException(
+            "the cache is kept by each process, so the workers would never see "
+            "the new geodata generation; set CACHE_TYPE to RedisCache"
+        )
+    generation = invalidate_geodata()
+    click.echo(f"geodata is now at generation {generation}")
+
+
+@click.command("recalc_successors")
+@click.option(
+    "-s",
+    "--since",
+    type=click.DateTime(),
+    default=None,
+    help="Only streets edited since this time, and the streets they succeed",
+)
+@with_appcontext
+def recalc_successors(since):
+    """Recompute the single-successor name of every street."""
+    from chicagodir.streets.models import Street
+
+    changed = Street.recalculate_successor_names(since=since)
+    click.echo(f"{changed} successor names changed")
+
+
+@click.command("inherit_grids")
+@with_appcontext
+def inherit_grids():
+    """Fill in grid locations of every street from its current successors."""
+    from chicagodir.streets.models import Street
+
+    changed = Street.inherit_all_grid_locations()
+    click.echo(f"{changed} streets inherited a grid location")
+
+
+@click.command("refresh_geometry")
+@click.option(
+    "-a",
+    "--all",
+    "everything",
+    is_flag=True,
+    default=False,
+    help="Recompute every street, not just those marked stale",
+)
+@with_appcontext
+def refresh_geometry(everything):
+    """Recompute the derived geometry of streets."""
+    from chicagodir.database import db
+    from chicagodir.streets.models import Street
+
+    if everything:
+        Street.query.update(
+            {Street.derived_geom_source: None}, synchronize_session=False
+        )
+        db.session.commit()
+    refreshed = Street.refresh_stale_geometry()
+    click.echo(f"{refreshed} street geometries recomputed")
+
+
+@click.command("rebuild_tags")
+@with_appcontext
+def rebuild_tags():
+    """Recount the streets carrying each tag."""
+    from chicagodir.streets.models import StreetTag
+
+    StreetTag.rebuild()
+    click.echo(f"{StreetTag.query.count()} tags counted")
+
+
+@click.command("rebuild_lineage")
+@with_appcontext
+def rebuild_lineage():
+    """Rebuild the street lineage table from every street change."""
+    from chicagodir.streets.models import StreetLineage
+
+    StreetLineage.rebuild()
+    click.echo(f"{StreetLineage.query.count()} street lineage rows")
+
+
+@click.command("rebuild_professions")
+@with_appcontext
+def rebuild_professions():
+    """Recount the entries giving each profession, in every directory."""
+    from chicagodir.directory.models import ProfessionCount
+
+    ProfessionCount.rebuild()
+    click.echo(f"{ProfessionCount.query.count()} directory professions counted")
+
+
+@click.command("rematch_streets")
+@click.option(
+    "-d",
+    "--directory",
+    "tags",
+    multiple=True,
+    help="Tag of a directory to rematch; every directory if none are given",
+)
+@with_appcontext
+def rematch_streets(tags):
+    """Match the addresses of directory entries to streets again."""
+    from chicagodir.directory.models import Directory
+    from chicagodir.directory.rematch import rematch_addresses
+
+    directory_ids = None
+    if tags:
+        directories = Directory.query.filter(Directory.tag.in_(tags)).all()
+        unknown = set(tags) - {d.tag for d in directories}
+        if unknown:
+            raise click.BadParameter(
+                "no such directory: {}".format(", ".join(sorted(unknown)))
+            )
+        directory_ids = [d.id for d in directories]
+    report = rematch_addresses(directory_ids=directory_ids)
+    click.echo(f"{report['changed']} of {report['addresses']} address streets changed")
@@ -0,0 +1,272 @@
+"""Bulk loading of directory pages from OCR'd CSV."""
+
+from collections import Counter
+
+from chicagodir.database import db
+from chicagodir.directory.models import (
+    MATCH_KEY_COLUMNS,
+    Address,
+    Entry,
+    Page,
+    ProfessionCount,
+    int_or_none,
+    profession_key,
+)
+from chicagodir.streets.matching import street_key
+from chicagodir.streets.models import Street
+
+# rows normalised and written at a time
+INGEST_BATCH_SIZE = 500
+
+ENTRY_COLUMNS = {
+    "first_name": "FirstName",
+    "last_name": "LastName",
+    "middle_name": "MiddleName",
+    "profession": "Profession",
+}
+
+# address column -> CSV column, after the Home or Work prefix
+ADDRESS_COLUMNS = {
+    "number": "AddressNumber",
+    "street_name_pre_directional": "AddressStreetNamePreDirectional",
+    "street_name": "AddressStreetName",
+    "street_name_post_type": "AddressStreetNamePostType",
+    "subaddress_type": "AddressSubaddressType",
+    "subaddress_identifier": "AddressSubaddressIdentifier",
+    "building_name": "AddressBuildingName",
+}
+
+REQUIRED_COLUMNS = (
+    {"page", "Widow", "HomeAddressPlaceName"}
+    | set(ENTRY_COLUMNS.values())
+    | {"Home" + column for column in ADDRESS_COLUMNS.values()}
+    | {"Work" + column for column in ADDRESS_COLUMNS.values()}
+)
+
+ALLOCATE_ADDRESS_IDS_SQL = """
+SELECT nextval(pg_get_serial_sequence('d_address', 'id'))
+FROM generate_series(1, :count)
+"""
+
+
+class IngestReport:
+    """What became of an uploaded page, row by row."""
+
+    def __init__(self):
+        """Start with nothing read."""
+        self.page_number = None
+        self.rows = 0
+        self.entries = 0
+        # (line, message) pairs; errors are rows, or files, not loaded
+        self.errors = []
+        self.warnings = []
+        # (home or work, match outcome) -> count
+        self.matches = Counter()
+        # profession_key -> entries loaded
+        self.professions = Counter()
+
+    def error(self, line: int, message: str):
+        """Record that a row, or the whole file, was not loaded."""
+        self.errors.append((line, message))
+
+    def warn(self, line: int, message: str):
+        """Record that a row was loaded despite a problem."""
+        self.warnings.append((line, message))
+
+    def as_dict(self) -> dict:
+        """The report as plain data, to hand back from a job or as JSON."""
+        return {
+            "page_number": self.page_number,
+            "rows": self.rows,
+            "entries": self.entries,
+            "errors": self.errors,
+            "warnings": self.warnings,
+            "matches": {
+                "{} {}".format(kind, outcome): count
+                for (kind, outcome), count in sorted(self.matches.items())
+            },
+        }
+
+
+def blank_to_none(row: dict) -> dict:
+    """Make empty strings Nones for DB insert purposes."""
+    return {key: (None if value == "" else value) for key, value in row.items()}
+
+
+def address_values(row: dict, kind: str, line: int, report: IngestReport) -> dict:
+    """Pull the home or work address out of a normalised row."""
+    prefix = kind.capitalize()
+    values = {
+        column: row[prefix + csv_column]
+        for column, csv_column in ADDRESS_COLUMNS.items()
+    }
+    values["type_"] = kind
+    # only home addresses have a place name in the OCR output
+    values["place_name"] = row["HomeAddressPlaceName"] if kind == "home" else ""
+    values.update(
+        zip(
+            MATCH_KEY_COLUMNS,
+            street_key(
+                values["street_name"],
+                values["street_name_post_type"],
+                values["street_name_pre_directional"],
+            ),
+        )
+    )
+    if values["number"] is not None:
+        number = int_or_none(values["number"])
+        if number is None:
+            report.warn(
+                line,
+                "{} address number {!r} is not a number".format(kind, values["number"]),
+            )
+        values["number"] = number
+    return values
+
+
+def replace_page(directory, number: int) -> int:
+    """Remove any existing copy of a page, with its entries, and start it afresh.
+
+    The entries removed are taken off the directory's profession counts.
+    """
+    old_pages = db.select(Page.id).filter(
+        Page.directory_id == directory.id, Page.number == number
+    )
+    old_entries = db.session.query(
+        Entry.home_address_id, Entry.work_address_id, Entry.profession
+    ).filter(Entry.page_id.in_(old_pages))
+    old_addresses = []
+    old_professions = Counter()
+    for home_address_id, work_address_id, profession in old_entries:
+        old_addresses.extend(
+            address_id
+            for address_id in (home_address_id, work_address_id)
+            if address_id is not None
+        )
+        old_professions[profession_key(profession)] -= 1
+    ProfessionCount.adjust(directory.id, old_professions)
+    Entry.query.filter(Entry.page_id.in_(old_pages)).delete(synchronize_session=False)
+    db.session.query(Address).filter(Address.id.in_(old_addresses)).delete(
+        synchronize_session=False
+    )
+    Page.query.filter(Page.id.in_(old_pages)).delete(synchronize_session=False)
+
+    page = Page(number=number, directory_id=directory.id)
+    db.session.add(page)
+    db.session.flush()
+    return page.id
+
+
+def write_batch(batch, first_line: int, page_id: int, year: int, matcher, report):
+    """Normalise a batch of rows and insert their entries and addresses."""
+    entries = []
+    addresses = []
+    for line, row in enumerate(batch, start=first_line):
+        report.rows += 1
+        row = blank_to_none(row)
+        if int_or_none(row["page"]) != report.page_number:
+            report.error(
+                line,
+                "row is for page {!r}, not {}".format(row["page"], report.page_number),
+            )
+            continue
+
+        entry = {
+            column: row[csv_column] for column, csv_column in ENTRY_COLUMNS.items()
+        }
+        entry["page_id"] = page_id
+        entry["widow"] = bool(row["Widow"])
+        report.professions[profession_key(entry["profession"])] += 1
+        for kind in ("home", "work"):
+            address = address_values(row, kind, line, report)
+            match = matcher.match(
+                name=address["street_name"],
+                suffix=address["street_name_post_type"],
+                direction=address["street_name_pre_directional"],
+                year=year,
+                fuzzy=True,
+            )
+            if address["street_name"]:
+                report.matches[kind, match.outcome] += 1
+            if match.distance and match.street_id is not None:
+                report.warn(
+                    line,
+                    "{} street {!r} taken to be street {}".format(
+                        kind, address["street_name"], match.street_id
+                    ),
+                )
+            address["street_id"] = match.street_id
+            addresses.append(address)
+            # the index of the address until its id is known
+            entry[kind + "_address_id"] = len(addresses) - 1
+        entries.append(entry)
+
+    if not entries:
+        return
+    address_ids = [
+        address_id
+        for (address_id,) in db.session.execute(
+            db.text(ALLOCATE_ADDRESS_IDS_SQL), {"count": len(addresses)}
+        )
+    ]
+    for address, address_id in zip(addresses, address_ids):
+        address["id"] = address_id
+    for entry in entries:
+        entry["home_address_id"] = address_ids[entry["home_address_id"]]
+        entry["work_address_id"] = address_ids[entry["work_address_id"]]
+
+    # executemany, which psycopg2 sends as multi-row VALUES
+    db.session.execute(Address.__table__.insert(), addresses)
+    db.session.execute(Entry.__table__.insert(), entries)
+    report.entries += len(entries)
+
+
+def ingest_page(
+    directory, rows, matcher=None, batch_size: int = INGEST_BATCH_SIZE, progress=None
+):
+    """Replace a page of a directory with the given CSV rows, in one transaction.
+
+    rows is an iterable of dicts, as from csv.DictReader, consumed batch_size
+    rows at a time; the page number is taken from the first. Streets are
+    matched in memory against matcher, by default one over every street.
+    Returns an IngestReport. If the file as a whole is unusable nothing is
+    written; rows that are not usable are left out and reported. progress,
+    if given, is called with the report after every batch.
+    """
+    report = IngestReport()
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        report.error(1, "no rows")
+        return report
+    missing = REQUIRED_COLUMNS - set(first)
+    if missing:
+        report.error(1, "missing columns: {}".format(", ".join(sorted(missing))))
+        return report
+    report.page_number = int_or_none(first["page"])
+    if report.page_number is None:
+        report.error(2, "page number {!r} is not a number".format(first["page"]))
+        return report
+
+    if matcher is None:
+        matcher = Street.street_matcher()
+    try:
+        page_id = replace_page(directory, report.page_number)
+        # line 1 is the header
+        line = 2
+        batch = [first]
+        for row in rows:
+            if len(batch) >= batch_size:
+                write_batch(batch, line, page_id, directory.year, matcher, report)
+                line += len(batch)
+                batch = []
+                if progress is not None:
+                    progress(report)
+            batch.append(row)
+        write_batch(batch, line, page_id, directory.year, matcher, report)
+        ProfessionCount.adjust(directory.id, report.professions)
+        db.session.commit()
+    except Exception:  # noqa: B902
+        db.session.rollback()
+        raise
+    return report
@@ -1,8 +1,23 @@
 # -*- coding: utf-8 -*-
 """Directory models."""
-
-from chicagodir.database import Column, PkModel, db, reference_col, relationship
-from chicagodir.streets.models import Street
+import re
+from collections import Counter
+
+from chicagodir.database import Column, Model, PkModel, db, reference_col, relationship
+from chicagodir.streets.matching import (
+    StreetMatch,
+    StreetMatcher,
+    edit_distance,
+    fuzzy_bound,
+    street_key,
+)
+from chicagodir.streets.sorting import fix_street_name
+
+# the Address columns holding its street_key
+MATCH_KEY_COLUMNS = ("match_name", "match_suffix", "match_direction")
+# pg_trgm similarity an address's name needs to a street's to be checked
+# for edits; low, as a couple of OCR errors leave few trigrams in common
+NEAR_NAME_SIMILARITY = 0.2
 
 
 def int_or_none(x) -> int:
@@ -15,12 +30,50 @@ def int_or_none(x) -> int:
         return None
 
 
-def get_all_jobs():
-    """Find all the professions in the known directories."""
-    return (
-        db.session.query(Entry.profession, db.func.count(Entry.id))
-        .group_by(Entry.profession)
-        .order_by(db.func.count(Entry.id).desc())
+# the directories' abbreviations of common professions
+profession_map = {
+    "AGT": "AGENT",
+    "BKKPR": "BOOKKEEPER",
+    "CARP": "CARPENTER",
+    "CLK": "CLERK",
+    "DRESSMKR": "DRESSMAKER",
+    "ENGR": "ENGINEER",
+    "LAB": "LABORER",
+    "MACH": "MACHINIST",
+    "MGR": "MANAGER",
+    "MER": "MERCHANT",
+    "PHYS": "PHYSICIAN",
+    "PTR": "PAINTER",
+    "SALESMN": "SALESMAN",
+    "STENOG": "STENOGRAPHER",
+    "TCHR": "TEACHER",
+    "TMSTR": "TEAMSTER",
+    "TRAV": "TRAVELER",
+}
+
+
+def profession_key(raw_profession) -> str:
+    """Normalise a profession as written, so that its variants are counted together.
+
+    Case, punctuation and spacing are ignored, and common abbreviations are
+    spelled out; a blank profession gives None.
+    """
+    words = re.sub(r"[^\w\s]", " ", raw_profession or "").upper().split()
+    return " ".join(profession_map.get(word, word) for word in words) or None
+
+
+def get_all_jobs(directory_id: int = None):
+    """Find all the professions, with their number of entries, most common first.
+
+    The counts are those kept in ProfessionCount, across every directory
+    or in the one given.
+    """
+    count = db.func.sum(ProfessionCount.entry_count)
+    q = db.session.query(ProfessionCount.profession, count)
+    if directory_id is not None:
+        q = q.filter(ProfessionCount.directory_id == directory_id)
+    return q.group_by(ProfessionCount.profession).order_by(
+        count.desc(), ProfessionCount.profession
     )
 
 
@@ -44,62 +97,15 @@ class Directory(PkModel):
         """Represent instance as a unique string."""
         return f"<Dir({self.year}|{self.name!r})>"
 
-    def new_page(self, csv_output):
-        """Add a new page."""
-        new_page_num = csv_output[0]["page"]
-        # check to see if page already exists
-        existing_page = Page.query.filter(
-            db.and_(Page.number == new_page_num, Page.directory == self)
-        ).one_or_none()
-        if existing_page:
-            db.session.delete(existing_page)
-        new_page = Page(number=new_page_num, directory=self)
-        new_page.save()
-        i = 0
-        rows = []
-        for row in csv_output:
-            # first, make empty strings Nones for DB insert purposes
-            for key, value in row.items():
-                if value == "":
-                    row[key] = None
-
-            new_entry = Entry(page_id=new_page.id)
-            new_entry.first_name = row["FirstName"]
-            new_entry.last_name = row["LastName"]
-            new_entry.middle_name = row["MiddleName"]
-            new_entry.profession = row["Profession"]
-            new_entry.widow = bool(row["Widow"])
-            new_entry.home_address = HomeAddress(
-                number=int_or_none(row["HomeAddressNumber"]),
-                street_name_pre_directional=row["HomeAddressStreetNamePreDirectional"],
-                # street_name_pre_type=row["HomeAddressStreetNamePreType"],
-                street_name=row["HomeAddressStreetName"],
-                street_name_post_type=row["HomeAddressStreetNamePostType"],
-                subaddress_type=row["HomeAddressSubaddressType"],
-                subaddress_identifier=row["HomeAddressSubaddressIdentifier"],
-                building_name=row["HomeAddressBuildingName"],
-                place_name=row["HomeAddressPlaceName"],
-                dir_entry=new_entry,
-            )
-            new_entry.home_address.save()
-            new_entry.home_address.find_street()
-            new_entry.work_address = WorkAddress(
-                number=int_or_none(row["WorkAddressNumber"]),
-                street_name_pre_directional=row["WorkAddressStreetNamePreDirectional"],
-                # street_name_pre_type=row["WorkAddressStreetNamePreType"],
-                street_name=row["WorkAddressStreetName"],
-                street_name_post_type=row["WorkAddressStreetNamePostType"],
-                subaddress_type=row["WorkAddressSubaddressType"],
-                subaddress_identifier=row["WorkAddressSubaddressIdentifier"],
-                building_name=row["WorkAddressBuildingName"],
-                dir_entry=new_entry,
-            )
-            new_entry.work_address.save()
-            new_entry.work_address.find_street()
-            rows.append(new_entry)
-            new_entry.save()
-            i += 1
-        return i
+    def new_page(self, rows, matcher=None, progress=None):
+        """Add a new page, replacing any already loaded with the same number.
+
+        rows are the CSV rows of the page; see ingest_page, which returns a
+        report of what was loaded.
+        """
+        from chicagodir.directory.ingest import ingest_page
+
+        return ingest_page(self, rows, matcher=matcher, progress=progress)
 
 
 class Page(PkModel):
@@ -117,6 +123,19 @@ class Address(PkModel):
     """An address within a directory."""
 
     __tablename__ = "d_address"
+    # the reverse index from streets to the addresses that may match them
+    __table_args__ = (
+        db.Index(
+            "idx_d_address_match_key", "match_name", "match_suffix", "match_direction"
+        ),
+        # finds the names an edited street's name may be mistaken for
+        db.Index(
+            "idx_d_address_match_name_trgm",
+            "match_name",
+            postgresql_using="gin",
+            postgresql_ops={"match_name": "gin_trgm_ops"},
+        ),
+    )
 
     type_ = db.Column(db.String(20), nullable=False)
 
@@ -138,15 +157,75 @@ class Address(PkModel):
     street_id = reference_col("streets", nullable=True)
     street = relationship("Street", foreign_keys=[street_id])
 
-    def find_street(self) -> Street:
-        """Recalcuate the best street for this entry."""
-        self.street = Street.find_best_street(
+    # street_key of the address, set when it is loaded or rematched
+    match_name = Column(db.String(), nullable=True)
+    match_suffix = Column(db.String(), nullable=True)
+    match_direction = Column(db.String(), nullable=True)
+
+    @classmethod
+    def names_near(cls, names) -> set:
+        """Match names of addresses within fuzzy_bound of any of the given names.
+
+        Candidates come from the trigram index on match_name, and are then
+        checked by edit distance. A short name with an error may share too
+        few trigrams to be found; `flask rematch_streets` catches those.
+        """
+        names = {fix_street_name(name) for name in names if name}
+        if not names:
+            return set()
+        # for the % operator, for the rest of this transaction only
+        db.session.execute(
+            db.text("SELECT set_config('pg_trgm.similarity_threshold', :limit, true)"),
+            {"limit": str(NEAR_NAME_SIMILARITY)},
+        )
+        candidates = (
+            db.session.query(cls.match_name)
+            .filter(db.or_(*(cls.match_name.op("%")(name) for name in names)))
+            .distinct()
+        )
+        return {
+            candidate
+            for (candidate,) in candidates
+            if any(
+                edit_distance(candidate, name, fuzzy_bound(name)) <= fuzzy_bound(name)
+                for name in names
+            )
+        }
+
+    @classmethod
+    def affected_by_street(cls, street_id: int, names):
+        """Filter clause for addresses an edit to a street may match differently.
+
+        These are the addresses matched to the street now, and those whose
+        name is the same as, or near enough to be mistaken for, any of the
+        names, the street's old and new.
+        """
+        return db.or_(
+            cls.street_id == street_id, cls.match_name.in_(cls.names_near(names))
+        )
+
+    def match_street(
+        self, matcher: StreetMatcher, year: int = None, fuzzy: bool = True
+    ) -> StreetMatch:
+        """Match this address using a prepared matcher, keeping the street if unique."""
+        match = matcher.match(
             name=self.street_name,
             suffix=self.street_name_post_type,
             direction=self.street_name_pre_directional,
-            year=self.dir_entry.page.directory.year,
+            year=year,
+            fuzzy=fuzzy,
         )
-        return self.street
+        self.street_id = match.street_id
+        for column, value in zip(
+            MATCH_KEY_COLUMNS,
+            street_key(
+                self.street_name,
+                self.street_name_post_type,
+                self.street_name_pre_directional,
+            ),
+        ):
+            setattr(self, column, value)
+        return match
 
     def render(self) -> str:
         """Render this as an address string."""
@@ -231,3 +310,69 @@ class Entry(PkModel):
 
     # this is a bad entry, just skip it
     skip = Column(db.Boolean(), default=False)
+
+
+class ProfessionCount(Model):
+    """How many entries of a directory give each profession, kept up to date on ingest."""
+
+    __tablename__ = "profession_counts"
+
+    directory_id = Column(
+        db.Integer(), db.ForeignKey("directories.id"), primary_key=True
+    )
+    # a profession_key
+    profession = Column(db.String(), primary_key=True)
+    entry_count = Column(db.Integer(), nullable=False)
+
+    @classmethod
+    def adjust(cls, directory_id: int, changes: dict):
+        """Add to the count of each profession in a directory, by profession_key.
+
+        Counts may go down as well as up; professions no entry gives any
+        longer are dropped. Rows are locked in profession order, so pages
+        loaded at once by different workers do not deadlock.
+        """
+        changes = {key: n for key, n in changes.items() if key is not None and n}
+        if not changes:
+            return
+        professions = sorted(changes)
+        db.session.execute(
+            db.text(PROFESSION_COUNT_SQL),
+            {
+                "directory_id": directory_id,
+                "professions": professions,
+                "changes": [changes[key] for key in professions],
+            },
+        )
+        cls.query.filter(
+            cls.directory_id == directory_id,
+            cls.profession.in_(professions),
+            cls.entry_count <= 0,
+        ).delete(synchronize_session=False)
+
+    @classmethod
+    def rebuild(cls):
+        """Recount every profession of every directory from scratch."""
+        cls.query.delete(synchronize_session=False)
+        q = (
+            db.session.query(Page.directory_id, Entry.profession)
+            .join(Entry, Entry.page_id == Page.id)
+            .order_by(Page.directory_id)
+            .yield_per(10000)
+        )
+        counts = {}
+        for directory_id, profession in q:
+            counts.setdefault(directory_id, Counter())[profession_key(profession)] += 1
+        for directory_id, professions in counts.items():
+            cls.adjust(directory_id, professions)
+        db.session.commit()
+
+
+PROFESSION_COUNT_SQL = """
+INSERT INTO profession_counts (directory_id, profession, entry_count)
+SELECT :directory_id, changes.profession, changes.entry_count
+FROM unnest(CAST(:professions AS varchar[]), CAST(:changes AS integer[]))
+    AS changes(profession, entry_count)
+ON CONFLICT (directory_id, profession) DO UPDATE
+    SET entry_count = profession_counts.entry_count + EXCLUDED.entry_count
+"""
@@ -0,0 +1,138 @@
+"""Re-resolving the streets of addresses already loaded, in bulk."""
+
+from chicagodir.database import db
+from chicagodir.directory.models import Address, Directory, Entry, Page
+from chicagodir.streets.matching import street_key
+from chicagodir.streets.models import Street
+
+# addresses matched and written at a time
+REMATCH_BATCH_SIZE = 2000
+
+UPDATE_ADDRESS_STREETS_SQL = """
+UPDATE d_address SET street_id = changes.street_id,
+    match_name = changes.match_name,
+    match_suffix = changes.match_suffix,
+    match_direction = changes.match_direction
+FROM unnest(CAST(:ids AS integer[]), CAST(:street_ids AS integer[]),
+            CAST(:names AS text[]), CAST(:suffixes AS text[]),
+            CAST(:directions AS text[]))
+    AS changes(id, street_id, match_name, match_suffix, match_direction)
+WHERE d_address.id = changes.id
+"""
+
+
+def address_batches(address_column, filters, batch_size: int):
+    """Yield the addresses in an entry column, with their year, a batch at a time.
+
+    Rows are (id, name, suffix, direction, street_id, year) followed by the
+    street_key stored for the address, in id order; each batch starts after
+    the last id of the one before, so rows updated in the meantime are not
+    revisited.
+    """
+    q = (
+        db.session.query(
+            Address.id,
+            Address.street_name,
+            Address.street_name_post_type,
+            Address.street_name_pre_directional,
+            Address.street_id,
+            Directory.year,
+            Address.match_name,
+            Address.match_suffix,
+            Address.match_direction,
+        )
+        .join(Entry, address_column == Address.id)
+        .join(Page, Entry.page_id == Page.id)
+        .join(Directory, Page.directory_id == Directory.id)
+        .filter(*filters)
+        .order_by(Address.id)
+    )
+    last_id = 0
+    while True:
+        batch = q.filter(Address.id > last_id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def changed_addresses(batch, matcher, matches: dict) -> tuple:
+    """Match a batch of addresses, giving those whose street or key is out of date.
+
+    Gives a dict of address id -> (street id, street_key), and how many of
+    those addresses have a different street. matches memoises street ids
+    by name, suffix, direction and year across batches, as the same street
+    is written the same way on many entries.
+    """
+    changes = {}
+    moved = 0
+    for address_id, name, suffix, direction, street_id, year, *stored_key in batch:
+        key = (name, suffix, direction, year)
+        if key not in matches:
+            matches[key] = matcher.match(
+                name, suffix, direction, year, fuzzy=True
+            ).street_id
+        match_key = street_key(name, suffix, direction)
+        if matches[key] != street_id or tuple(stored_key) != match_key:
+            changes[address_id] = (matches[key], match_key)
+            moved += matches[key] != street_id
+    return changes, moved
+
+
+def rematch_addresses(
+    directory_ids=None,
+    page_ids=None,
+    where=None,
+    matcher=None,
+    batch_size: int = REMATCH_BATCH_SIZE,
+    progress=None,
+) -> dict:
+    """Match the addresses of directory entries to streets again.
+
+    Addresses are limited to the given directories or pages, and to those
+    satisfying where, a filter clause on Address, if any; they are matched
+    against matcher, by default one over every street, built once for the
+    whole run. Only addresses whose street, or stored street_key, is out
+    of date are written, batch_size at a time, each batch in its own
+    transaction. Returns the number of addresses checked and of those
+    whose street changed; progress, if given, is called with the same after
+    every batch.
+    """
+    filters = []
+    if directory_ids is not None:
+        filters.append(Page.directory_id.in_(directory_ids))
+    if page_ids is not None:
+        filters.append(Page.id.in_(page_ids))
+    if where is not None:
+        filters.append(where)
+    if matcher is None:
+        matcher = Street.street_matcher()
+
+    matches = {}
+    report = {"addresses": 0, "changed": 0}
+    for address_column in (Entry.home_address_id, Entry.work_address_id):
+        for batch in address_batches(address_column, filters, batch_size):
+            changes, moved = changed_addresses(batch, matcher, matches)
+            if changes:
+                write_changes(changes)
+            db.session.commit()
+            report["addresses"] += len(batch)
+            report["changed"] += moved
+            if progress is not None:
+                progress(report)
+    return report
+
+
+def write_changes(changes: dict):
+    """Store the streets and street_keys of addresses, from changed_addresses."""
+    keys = [key for _, key in changes.values()]
+    db.session.execute(
+        db.text(UPDATE_ADDRESS_STREETS_SQL),
+        {
+            "ids": list(changes),
+            "street_ids": [street_id for street_id, _ in changes.values()],
+            "names": [name for name, _, _ in keys],
+            "suffixes": [suffix for _, suffix, _ in keys],
+            "directions": [direction for _, _, direction in keys],
+        },
+    )
@@ -0,0 +1,80 @@
+"""Tasks that workers can perform on directories."""
+
+import csv
+import io
+import logging
+
+from rq import get_current_job
+
+from chicagodir.directory.models import Address, Directory
+from chicagodir.directory.rematch import rematch_addresses
+
+
+def ingest_page_csv(directory_id: int, data: bytes, filename: str = "") -> dict:
+    """Load a page of a directory from the contents of its CSV file.
+
+    Progress, in rows, is kept in the job's meta as batches are written; the
+    report of what was loaded is the job's result.
+    """
+    directory = Directory.get_by_id(directory_id)
+    text = data.decode("utf-8")
+    job = get_current_job()
+
+    def progress(report):
+        if job is not None:
+            job.meta.update(rows=report.rows, entries=report.entries)
+            job.save_meta()
+
+    if job is not None:
+        # a guess, as quoted fields may hold newlines
+        job.meta.update(
+            filename=filename, rows=0, entries=0, total_rows=text.count("\n") - 1
+        )
+        job.save_meta()
+
+    report = directory.new_page(csv.DictReader(io.StringIO(text)), progress=progress)
+    progress(report)
+    logging.info(
+        "%s: page %s, %s of %s rows loaded",
+        filename,
+        report.page_number,
+        report.entries,
+        report.rows,
+    )
+    return report.as_dict()
+
+
+def rematch_directory_streets(directory_ids=None) -> dict:
+    """Match every address of the given directories, or all of them, to streets again.
+
+    Progress is kept in the job's meta as batches are written; the number
+    of addresses checked and changed is the job's result.
+    """
+    job = get_current_job()
+
+    def progress(report):
+        if job is not None:
+            job.meta.update(report)
+            job.save_meta()
+
+    report = rematch_addresses(directory_ids=directory_ids, progress=progress)
+    logging.info(
+        "%s of %s address streets changed", report["changed"], report["addresses"]
+    )
+    return report
+
+
+def rematch_street_addresses(street_id: int, names) -> dict:
+    """Match again the addresses whose match an edit to a street may have changed.
+
+    names are the street's names before and after the edit; see
+    Address.affected_by_street.
+    """
+    report = rematch_addresses(where=Address.affected_by_street(street_id, names))
+    logging.info(
+        "%s of %s addresses near %s moved street",
+        report["changed"],
+        report["addresses"],
+        ", ".join(names),
+    )
+    return report
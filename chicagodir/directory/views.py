@@ -1,14 +1,49 @@
 # -*- coding: utf-8 -*-
 """Public section, including homepage and signup."""
-import csv
-
-from flask import Blueprint, flash, redirect, render_template, request, url_for
+import os
+import zipfile
+
+from flask import (
+    Blueprint,
+    abort,
+    flash,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
 from flask_login import login_required
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
 
 from chicagodir.directory.models import Directory, Page, get_all_jobs
+from chicagodir.directory.rematch import rematch_addresses
+from chicagodir.directory.tasks import ingest_page_csv, rematch_directory_streets
+from chicagodir.jobs import JobRequest, dispatch, redis_connection
 
 blueprint = Blueprint("dir", __name__, static_folder="../static")
 
+# how long a page may take to load, and how long its report is kept after
+UPLOAD_JOB_TIMEOUT = 10 * 60
+UPLOAD_RESULT_TTL = 24 * 60 * 60
+# rematching visits every address of a directory
+REMATCH_JOB_TIMEOUT = 30 * 60
+
+
+def uploaded_pages(file):
+    """The name and contents of each page CSV in an upload, a CSV or a zip of them."""
+    if not file.filename.lower().endswith(".zip"):
+        return [(file.filename, file.read())]
+    with zipfile.ZipFile(file.stream) as archive:
+        return [
+            (os.path.basename(info.filename), archive.read(info))
+            for info in sorted(archive.infolist(), key=lambda info: info.filename)
+            if not info.is_dir()
+            and info.filename.lower().endswith(".csv")
+            and not info.filename.startswith("__MACOSX/")
+        ]
+
 
 @blueprint.route("/dir/", methods=["GET", "POST"])
 def directory_listing():
@@ -24,6 +59,15 @@ def profession_listing():
     return render_template("dir/job_listing.html", jobs=get_all_jobs())
 
 
+@blueprint.route("/dir/<string:tag>/jobs/", methods=["GET"])
+def directory_profession_listing(tag: str):
+    """Show the professions in a directory."""
+    d = Directory.query.filter_by(tag=tag).one()
+    return render_template(
+        "dir/job_listing.html", jobs=get_all_jobs(directory_id=d.id), directory=d
+    )
+
+
 @blueprint.route("/dir/new", methods=["GET", "POST"])
 @login_required
 def new_directory():
@@ -53,13 +97,33 @@ def fix_page(tag: str, page_id: int):
     """Apply standard fixes to a page of a directory."""
     d = Directory.query.filter_by(tag=tag).one()
     page = Page.query.filter_by(directory_id=d.id, number=page_id).first()
-    for entry in page.entries:
-        if entry.home_address:
-            if entry.home_address.find_street():
-                entry.save()
+    if page is not None:
+        report = rematch_addresses(page_ids=[page.id])
+        flash("{} address streets changed".format(report["changed"]), "info")
     return redirect(url_for("dir.view_page", tag=tag, page=page_id))
 
 
+@blueprint.route("/dir/<string:tag>/rematch", methods=["POST"])
+@login_required
+def rematch_directory(tag: str):
+    """Match every address in a directory to streets again, in the background."""
+    d = Directory.query.filter_by(tag=tag).one()
+    (job,) = dispatch(
+        [
+            JobRequest(
+                rematch_directory_streets,
+                ([d.id],),
+                options={
+                    "timeout": REMATCH_JOB_TIMEOUT,
+                    "result_ttl": UPLOAD_RESULT_TTL,
+                },
+            )
+        ]
+    )
+    flash("Rematching streets, as job {}".format(job.id), "info")
+    return redirect(url_for("dir.view_directory", tag=tag))
+
+
 @blueprint.route("/dir/<string:tag>/page/upload", methods=["GET", "POST"])
 @login_required
 def upload_csv(tag: str):
@@ -76,10 +140,51 @@ def upload_csv(tag: str):
         if file.filename == "":
             flash("No selected file")
             return redirect(request.url)
-        if file:
-            csv_output = d.new_page(
-                list(csv.DictReader(x.decode() for x in file.stream))
+        try:
+            pages = uploaded_pages(file)
+        except zipfile.BadZipFile:
+            flash("Not a zip file")
+            return redirect(request.url)
+
+        # each page is loaded by a worker, so a zip of pages spreads across them
+        options = {"timeout": UPLOAD_JOB_TIMEOUT, "result_ttl": UPLOAD_RESULT_TTL}
+        jobs = list(
+            zip(
+                [filename for filename, _ in pages],
+                dispatch(
+                    [
+                        JobRequest(
+                            ingest_page_csv, (d.id, data, filename), options=options
+                        )
+                        for filename, data in pages
+                    ]
+                ),
             )
-        else:
-            csv_output = []
-    return render_template("dir/new_page.html", csv_output=csv_output, directory=d)
+        )
+    else:
+        jobs = []
+    return render_template("dir/new_page.html", jobs=jobs, directory=d)
+
+
+@blueprint.route("/dir/jobs/<string:job_id>", methods=["GET"])
+@login_required
+def upload_status(job_id: str):
+    """Report on the progress of loading an uploaded page."""
+    try:
+        job = Job.fetch(job_id, connection=redis_connection())
+    except NoSuchJobError:
+        abort(404)
+
+    status = {
+        "id": job.id,
+        "status": job.get_status(),
+        "filename": job.meta.get("filename"),
+        "rows": job.meta.get("rows", 0),
+        "total_rows": job.meta.get("total_rows"),
+        "entries": job.meta.get("entries", 0),
+    }
+    if job.is_finished:
+        status["report"] = job.result
+    elif job.is_failed and job.exc_info:
+        status["error"] = job.exc_info.strip().splitlines()[-1]
+    return jsonify(status)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Dispatching background jobs to the workers, folding repeats together."""
+import datetime
+from collections import namedtuple
+
+import redis
+from flask import current_app
+from rq import Queue
+from rq.job import JobStatus
+from rq.registry import ScheduledJobRegistry
+
+# queues, in the order workers take jobs from them: metadata that pages
+# show should be caught up on within seconds, maps can wait behind it
+FAST_QUEUE = "fast"
+DEFAULT_QUEUE = "default"
+MAPS_QUEUE = "maps"
+QUEUES = [FAST_QUEUE, DEFAULT_QUEUE, MAPS_QUEUE]
+
+# seconds a keyed job waits, so that repeats of it can be folded in
+JOB_DEBOUNCE_SECONDS = 10
+COALESCE_KEY = "jobs/coalesce/{}/{}"
+
+# a job to dispatch: the task and its arguments; the key, if any, that repeats
+# of it share; options for Queue.create_job, such as timeout; and its queue
+JobRequest = namedtuple(
+    "JobRequest",
+    ["func", "args", "key", "options", "queue"],
+    defaults=[(), None, {}, DEFAULT_QUEUE],
+)
+
+# connection pools, by Redis URL, shared by everything in the process
+_pools = {}
+
+
+def redis_connection(url: str = None) -> redis.Redis:
+    """A Redis client on the process's connection pool, for the app's Redis by default."""
+    url = url or current_app.config["REDIS_URL"]
+    if url not in _pools:
+        _pools[url] = redis.ConnectionPool.from_url(url)
+    return redis.Redis(connection_pool=_pools[url])
+
+
+def task_name(func) -> str:
+    """The dotted name of a task, given as a function or already by name."""
+    if isinstance(func, str):
+        return func
+    return "{}.{}".format(func.__module__, func.__qualname__)
+
+
+def dispatch(requests, debounce: int = None) -> list:
+    """Enqueue jobs, folding any with a key into one already waiting.
+
+    A request with a key is held back for the debounce window, by default
+    JOB_DEBOUNCE_SECONDS or as configured; other requests for the same task
+    and key in that window are dropped, as the waiting job will see their
+    changes when it runs. Requests without a key are queued at once. It all
+    takes two round trips to Redis. Returns the job for each request, or
+    None where it was folded into another.
+    """
+    if debounce is None:
+        debounce = current_app.config.get("JOB_DEBOUNCE_SECONDS", JOB_DEBOUNCE_SECONDS)
+    connection = redis_connection()
+    keyed = [request for request in requests if request.key is not None]
+    with connection.pipeline() as pipe:
+        for request in keyed:
+            pipe.set(
+                COALESCE_KEY.format(task_name(request.func), request.key),
+                1,
+                nx=True,
+                ex=debounce,
+            )
+        # in the order of the keyed requests
+        claimed = iter(pipe.execute())
+
+    queues = {
+        name: Queue(name, connection=connection)
+        for name in {request.queue for request in requests}
+    }
+    run_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=debounce
+    )
+    jobs = []
+    with connection.pipeline() as pipe:
+        for request in requests:
+            if request.key is not None and not next(claimed):
+                jobs.append(None)
+                continue
+            queue = queues[request.queue]
+            status = JobStatus.QUEUED if request.key is None else JobStatus.SCHEDULED
+            job = queue.create_job(
+                request.func, args=request.args, status=status, **request.options
+            )
+            if request.key is None:
+                queue.enqueue_job(job, pipeline=pipe)
+            else:
+                # as Queue.schedule_job, whose registry write skips the pipeline
+                pipe.sadd(queue.redis_queues_keys, queue.key)
+                job.save(pipeline=pipe)
+                pipe.zadd(
+                    ScheduledJobRegistry(queue=queue).key,
+                    {job.id: run_at.timestamp()},
+                )
+            jobs.append(job)
+        pipe.execute()
+    return jobs
@@ -21,9 +21,16 @@ SEND_FILE_MAX_AGE_DEFAULT = env.int("SEND_FILE_MAX_AGE_DEFAULT", default=0)
 BCRYPT_LOG_ROUNDS = env.int("BCRYPT_LOG_ROUNDS", default=13)
 DEBUG_TB_ENABLED = DEBUG
 DEBUG_TB_INTERCEPT_REDIRECTS = False
-CACHE_TYPE = "simple"  # Can be "memcached", "redis", etc.
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
 # redis stuff
 REDIS_URL = env.str("REDIS_URL", default="redis://redis:6379/0")
-QUEUES = ["default"]
+
+# the edit and geodata generations, and the snapshots and pages keyed by
+# them, must be shared by every web and worker process, so the cache is
+# Redis unless set otherwise; "SimpleCache" keeps them per process, so only
+# suits running a single one
+CACHE_TYPE = env.str("CACHE_TYPE", default="RedisCache")
+CACHE_REDIS_URL = REDIS_URL
+# seconds a street's refresh jobs wait, so that a run of edits is caught up on once
+JOB_DEBOUNCE_SECONDS = env.int("JOB_DEBOUNCE_SECONDS", default=10)
@@ -0,0 +1,221 @@
+"""Streaming exports of the streets table."""
+
+import json
+import zlib
+
+import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# the stored columns of the streets table; derived columns are left out
+EXPORT_COLUMNS = [
+    "id",
+    "street_id",
+    "start_date",
+    "start_date_circa",
+    "end_date",
+    "end_date_circa",
+    "grid_location",
+    "grid_direction",
+    "diagonal",
+    "direction",
+    "name",
+    "suffix",
+    "suffix_direction",
+    "min_address",
+    "max_address",
+    "current",
+    "vacated",
+    "historical_note",
+    "text",
+    "tags",
+    "confirmed",
+    "weird",
+    "skip",
+    "successor_name",
+    "geom",
+]
+EXPORT_BOOLEAN_COLUMNS = [
+    "start_date_circa",
+    "end_date_circa",
+    "diagonal",
+    "current",
+    "vacated",
+    "confirmed",
+    "weird",
+    "skip",
+]
+
+# characters that make COPY quote a CSV field
+CSV_SPECIAL = frozenset(',"\r\n')
+
+
+def server_side_rows(engine, sql: str, name: str, batch_size: int):
+    """Yield the rows of a query a batch at a time.
+
+    A named cursor keeps the result set on the server, so only one batch is
+    held in memory, and a slow client holds back the query as it reads.
+    """
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor(name=name)
+        cursor.itersize = batch_size
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        connection.close()
+
+
+def csv_field(value) -> str:
+    """Write a value as COPY ... (FORMAT csv) does.
+
+    NULL is left empty, and an empty string is quoted to tell them apart.
+    """
+    if value is None:
+        return ""
+    if value == "" or not CSV_SPECIAL.isdisjoint(value):
+        return '"{}"'.format(value.replace('"', '""'))
+    return value
+
+
+def csv_column(column: str) -> str:
+    """Select a column as the text COPY writes for it."""
+    if column in EXPORT_BOOLEAN_COLUMNS:
+        # a cast to text spells booleans out, where COPY writes t and f
+        return "CASE WHEN {0} THEN 't' WHEN NOT {0} THEN 'f' END".format(column)
+    return "{}::text".format(column)
+
+
+def csv_chunks(engine, batch_size: int = 2000):
+    """Stream the streets table as CSV, with a header row.
+
+    Every column is read as Postgres's own text for it, the same as a COPY
+    of the table would give.
+    """
+    sql = "SELECT {} FROM streets ORDER BY id".format(
+        ", ".join(map(csv_column, EXPORT_COLUMNS))
+    )
+    yield ",".join(EXPORT_COLUMNS) + "\n"
+    for rows in server_side_rows(engine, sql, "csv_export", batch_size):
+        yield "".join(",".join(map(csv_field, row)) + "\n" for row in rows)
+
+
+def geojsonl_chunks(engine, batch_size: int = 500):
+    """Stream the streets table as newline-delimited GeoJSON features in WGS84."""
+    properties = ", ".join(c for c in EXPORT_COLUMNS if c != "geom")
+    sql = """SELECT ST_AsGeoJSON(s.*, 'geom')
+             FROM (SELECT {}, ST_Transform(geom, 4326) AS geom
+                   FROM streets ORDER BY id) AS s""".format(
+        properties
+    )
+    for rows in server_side_rows(engine, sql, "geojsonl_export", batch_size):
+        yield "".join(row[0] + "\n" for row in rows)
+
+
+class _DrainableSink:
+    """Write-only file object whose contents can be taken away piece by piece."""
+
+    closed = False
+
+    def __init__(self):
+        """Start empty."""
+        self.buffer = []
+        self.position = 0
+
+    def write(self, data):
+        """Buffer some bytes."""
+        self.buffer.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        """Report how much has been written overall."""
+        return self.position
+
+    def flush(self):
+        """Nothing to flush."""
+
+    def close(self):
+        """Mark as closed."""
+        self.closed = True
+
+    def drain(self) -> bytes:
+        """Take everything written since the last drain."""
+        data = b"".join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def geoparquet_chunks(engine, batch_size: int = 5000):
+    """Stream the streets table as GeoParquet, one row group per batch."""
+    # spelled out, so that a batch where a column is all NULL still fits
+    types = {
+        "id": pa.int64(),
+        "start_date": pa.date32(),
+        "end_date": pa.date32(),
+        "grid_location": pa.int64(),
+        "min_address": pa.int64(),
+        "max_address": pa.int64(),
+        "tags": pa.list_(pa.string()),
+        "geom": pa.binary(),
+    }
+    for column in EXPORT_BOOLEAN_COLUMNS:
+        types[column] = pa.bool_()
+    schema = pa.schema([(c, types.get(c, pa.string())) for c in EXPORT_COLUMNS])
+
+    sql = "SELECT {} FROM streets ORDER BY id".format(", ".join(EXPORT_COLUMNS))
+    sink = _DrainableSink()
+    writer = None
+    with engine.connect() as connection:
+        for frame in gpd.read_postgis(
+            sql,
+            connection.execution_options(stream_results=True),
+            geom_col="geom",
+            chunksize=batch_size,
+        ):
+            if writer is None:
+                schema = schema.with_metadata(
+                    {b"geo": json.dumps(geoparquet_metadata(frame)).encode("utf-8")}
+                )
+                writer = pq.ParquetWriter(sink, schema)
+            writer.write_table(
+                pa.Table.from_pandas(
+                    frame.to_wkb(), schema=schema, preserve_index=False
+                )
+            )
+            yield sink.drain()
+
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def geoparquet_metadata(frame) -> dict:
+    """Build the GeoParquet "geo" file metadata for the streets geometry."""
+    return {
+        "version": "1.0.0",
+        "primary_column": "geom",
+        "columns": {
+            "geom": {
+                "encoding": "WKB",
+                "geometry_types": [],
+                "crs": frame.crs.to_json_dict() if frame.crs else None,
+            }
+        },
+    }
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of text or byte chunks on the fly."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
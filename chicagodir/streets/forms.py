@@ -15,7 +15,13 @@ from wtforms import (
     StringField,
     TextAreaField,
 )
-from wtforms.validators import DataRequired, Length, NumberRange, Optional
+from wtforms.validators import (
+    DataRequired,
+    Length,
+    NumberRange,
+    Optional,
+    ValidationError,
+)
 from wtforms.widgets import TextInput
 
 direction_choices = [("", ""), ("N", "N"), ("S", "S"), ("E", "E"), ("W", "W")]
@@ -70,6 +76,7 @@ class StreetSearchForm(Form):
     )
     confirmed = BooleanField("Confirmed")
     term = StringField("Query", validators=[Optional(), Length(max=40)])
+    fuzzy = BooleanField("Include similarly-spelled names")
 
 
 class ChangeForm(Form):
@@ -133,6 +140,11 @@ class StreetEditForm(FlaskForm):
         coerce=int_or_none,
     )
 
+    def validate_end_date(self, field):
+        """Check that a street does not end before it starts."""
+        if self.start_date.data and field.data and field.data < self.start_date.data:
+            raise ValidationError("End date must not be before the start date")
+
     def set_street_choices(self, street_choices):
         """Set up for proper street choices."""
         for successor in self.successors:
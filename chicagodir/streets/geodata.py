@@ -8,11 +8,18 @@ from geoalchemy2.shape import from_shape, to_shape
 from shapely.ops import clip_by_rect
 
 from chicagodir.database import db
+from chicagodir.extensions import cache
 
 from .grid_interpolate import Grid
 
 gridmaker = Grid()
 
+# bumped whenever comm_areas or city_limits are reloaded
+GEODATA_GENERATION_KEY = "geodata/generation"
+
+# GeoDataFrames kept by this process, and the generation they belong to
+_geodata = {}
+
 
 def clip_by_address(data, direction, min_address, max_address):
     """Return the given geodata clipped by a bounding box based on grid locations."""
@@ -43,36 +50,96 @@ def clip_by_address(data, direction, min_address, max_address):
     return from_shape(clipped, srid=data.srid)
 
 
-def load_areas(geom=None):
+def load_areas():
     """Load the community areas from the database."""
-    if geom:
-        sql = """SELECT id, name, geom from comm_areas
-                WHERE ST_Intersects(geom, ST_SetSRID(%(street_geom)s::geometry,3435))"""
-        assert geom.srid == 3435
+    sql = "SELECT id, name, geom from comm_areas"
 
-        with db.get_engine().connect() as connection:
-            return gpd.read_postgis(sql, connection, params={"street_geom": geom.data})
+    with db.get_engine().connect() as connection:
+        return gpd.read_postgis(sql, connection)
 
-    else:
-        sql = "SELECT id, name, geom from comm_areas"
 
-        with db.get_engine().connect() as connection:
-            return gpd.read_postgis(sql, connection)
+def load_all_city_limits():
+    """Load the city limits of every year from the database, in year order."""
+    sql = "SELECT year, geom FROM city_limits ORDER BY year"
+
+    with db.get_engine().connect() as connection:
+        return gpd.read_postgis(sql, connection)
+
 
+def load_street_geometries(street_ids):
+    """Load the stored derived geometry of many streets in one query.
 
-def find_city_limits_for_year(year: int):
-    """Load the city limits for this year from the database."""
-    if year < 1830:
-        year = 1830
-    sql = "SELECT year, geom FROM city_limits WHERE year <= %(year)s ORDER BY year DESC limit 1"
+    Gives a GeoDataFrame of id, stale and geom; the geometry of a stale
+    street is waiting to be recomputed, so must not be relied on.
+    """
+    sql = """SELECT id, derived_geom_source IS NULL AS stale, derived_geom AS geom
+            FROM streets WHERE id = ANY(%(ids)s)"""
 
     with db.get_engine().connect() as connection:
-        return gpd.read_postgis(sql, connection, params={"year": year})
+        return gpd.read_postgis(sql, connection, params={"ids": list(street_ids)})
+
+
+def geodata_generation() -> int:
+    """Return the current generation of the community area and city limit data."""
+    return cache.get(GEODATA_GENERATION_KEY) or 0
+
+
+def invalidate_geodata() -> int:
+    """Record that comm_areas or city_limits have been reloaded, for every process sharing the cache."""
+    _geodata.clear()
+    return cache.cache.inc(GEODATA_GENERATION_KEY)
+
+
+def cached_geodata(key: str, load):
+    """Return a GeoDataFrame kept for the life of the process, loading it if need be.
+
+    Everything kept is dropped when the geodata generation moves on. The
+    frames are shared, so must not be modified.
+    """
+    generation = geodata_generation()
+    if _geodata.get(GEODATA_GENERATION_KEY) != generation:
+        _geodata.clear()
+        _geodata[GEODATA_GENERATION_KEY] = generation
+    if key not in _geodata:
+        _geodata[key] = load()
+    return _geodata[key]
+
+
+def all_areas():
+    """All the community areas, from the process's geodata cache."""
+    return cached_geodata("comm_areas", load_areas)
+
+
+def areas_intersecting(geom):
+    """The community areas intersected by a geometry, from the geodata cache."""
+    areas = all_areas()
+    return areas[areas.intersects(to_shape(geom))]
+
+
+def all_city_limits():
+    """The city limits of every year, from the geodata cache."""
+    return cached_geodata("city_limits", load_all_city_limits)
+
+
+def city_limits_for_year(year: int):
+    """The city limits for this year, from the geodata cache."""
+    limits = all_city_limits()
+    return limits[limits["year"] <= max(year, 1830)].tail(1)
+
+
+def warm_geodata():
+    """Make sure the geodata cache is loaded and current.
+
+    Called by the worker before it forks for each job, so that the job
+    inherits the data rather than loading it again.
+    """
+    all_areas()
+    all_city_limits()
 
 
 def find_community_areas(geom):
     """Name the community areas intersected by given geometry."""
-    active_cas = load_areas(geom)
+    active_cas = areas_intersecting(geom)
     return [(int(n), COMMUNITY_AREAS[int(n)]) for n in active_cas["id"].unique()]
 
 
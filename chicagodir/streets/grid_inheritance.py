@@ -0,0 +1,124 @@
+"""Inherit grid positions from successor streets across the whole change graph."""
+
+from collections import namedtuple
+
+GridInfo = namedtuple(
+    "GridInfo", ["current", "diagonal", "grid_direction", "grid_location"]
+)
+
+
+def reverse_topological_components(nodes, edges):
+    """Group the nodes into strongly connected components, successors first.
+
+    edges maps a node to the nodes it changed into. This is Tarjan's
+    algorithm, done with an explicit stack so that long chains of changes
+    cannot hit the recursion limit; it emits every component only after all
+    the components reachable from it. Nodes are visited in sorted order so
+    that the output is the same from run to run.
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    work = []
+
+    def visit(node):
+        index[node] = lowlink[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+        work.append((node, iter(sorted(edges.get(node, ())))))
+
+    for root in sorted(nodes):
+        if root not in index:
+            visit(root)
+        while work:
+            node, children = work[-1]
+            child = next(children, None)
+            if child is None:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    components.append(_pop_component(stack, on_stack, node))
+            elif child not in index:
+                visit(child)
+            elif child in on_stack:
+                lowlink[node] = min(lowlink[node], index[child])
+    return components
+
+
+def _pop_component(stack, on_stack, root):
+    """Take a finished component, down to and including its root, off the stack."""
+    component = []
+    while True:
+        member = stack.pop()
+        on_stack.discard(member)
+        component.append(member)
+        if member == root:
+            return sorted(component)
+
+
+def current_successors(node, info, edges):
+    """The current streets a street leads to, as Street.find_current_successors.
+
+    The walk goes on only through streets that are not current, and stops
+    at each current street it reaches, so a current street reached only
+    through another current one is left out; one that can also be reached
+    some other way is kept.
+    """
+    if info[node].current:
+        return {node}
+    found = set()
+    seen = {node}
+    pending = [node]
+    while pending:
+        for child in edges.get(pending.pop(), ()):
+            if child in seen:
+                continue
+            seen.add(child)
+            if info[child].current:
+                found.add(child)
+            else:
+                pending.append(child)
+    return found
+
+
+def inherited(street, successors):
+    """Fill in a street's grid position from its current successors."""
+    directions = {s.grid_direction for s in successors} - {None}
+    if len(directions) == 1:
+        street = street._replace(grid_direction=directions.pop())
+    locations = {s.grid_location for s in successors} - {None}
+    if len(locations) == 1:
+        street = street._replace(grid_location=locations.pop())
+    if any(s.diagonal for s in successors):
+        street = street._replace(diagonal=True)
+    return street
+
+
+def inherit_grid_info(info, edges):
+    """Work out the inherited grid position of every street at once.
+
+    info maps a street id to its GridInfo and edges maps a street id to the
+    ids it changed into. Streets are settled successors first, so a street
+    always sees the final values of the streets it leads to. The rules are
+    those of Street.get_grid_location_from_successors: a street with any grid
+    information of its own is left alone, a direction or location is taken
+    when all its current successors agree on it, and a street is diagonal if
+    any of them is. Returns the new GridInfo of each street that changed.
+    """
+    components = reverse_topological_components(info, edges)
+    info = dict(info)
+    changed = {}
+    for component in components:
+        for node in component:
+            street = info[node]
+            if street.diagonal or street.grid_direction or street.grid_location:
+                continue
+            successors = [info[s] for s in current_successors(node, info, edges)]
+            updated = inherited(street, successors)
+            if updated != street:
+                info[node] = changed[node] = updated
+    return changed
@@ -0,0 +1,133 @@
+"""Drawing street maps over a pre-rendered basemap.
+
+Every map shares one extent and layout, so the grey community area
+boundaries, and the city limits of a year, are drawn once into a basemap
+image, and a map job only stamps that image down and draws its streets on
+top. The basemaps are kept on disk, as RQ runs each job in its own fork.
+"""
+
+import os
+import tempfile
+
+import matplotlib.pyplot as plt
+import numpy as np
+from geoalchemy2.shape import to_shape
+
+from chicagodir.streets.geodata import (
+    all_areas,
+    all_city_limits,
+    city_limits_for_year,
+    geodata_generation,
+    load_street_geometries,
+)
+from chicagodir.streets.models import Street
+
+MAP_DPI = 200
+# inches; the height follows from the extent
+MAP_WIDTH = 6.4
+# share of the map's height kept below the streets for its title
+TITLE_BAND = 0.04
+# space around the community areas and city limits, as a share of their size
+EXTENT_MARGIN = 0.02
+BASEMAP_DIR = os.path.join(tempfile.gettempdir(), "chicagodir-basemaps")
+
+
+def map_extent() -> tuple:
+    """The extent of every map, (x_min, x_max, y_min, y_max).
+
+    It takes in the community areas and every year's city limits, with a
+    margin, in the data's own projection.
+    """
+    bounds = np.vstack([all_areas().total_bounds, all_city_limits().total_bounds])
+    x_min, y_min = bounds[:, :2].min(axis=0)
+    x_max, y_max = bounds[:, 2:].max(axis=0)
+    margin = EXTENT_MARGIN * max(x_max - x_min, y_max - y_min)
+    return (x_min - margin, x_max + margin, y_min - margin, y_max + margin)
+
+
+def blank_map(extent: tuple):
+    """A figure with axes fixed to the extent, and a band below for a title."""
+    x_min, x_max, y_min, y_max = extent
+    height = MAP_WIDTH * (y_max - y_min) / (x_max - x_min) / (1 - TITLE_BAND)
+    fig = plt.figure(figsize=(MAP_WIDTH, height), dpi=MAP_DPI)
+    ax = fig.add_axes([0, TITLE_BAND, 1, 1 - TITLE_BAND])
+    ax.set_axis_off()
+    ax.set_xlim(x_min, x_max)
+    ax.set_ylim(y_min, y_max)
+    ax.set_aspect("equal")
+    # plotting must not move the extent the basemap was drawn for
+    ax.set_autoscale_on(False)
+    return fig, ax
+
+
+def render_basemap(path: str, extent: tuple, city_limits=None):
+    """Draw the community area boundaries, over the city limits if given, to a PNG."""
+    fig, ax = blank_map(extent)
+    if city_limits is not None:
+        city_limits.plot(ax=ax, facecolor="wheat", edgecolor="none")
+    all_areas().boundary.plot(ax=ax, color="grey", linewidth=0.25)
+    ax.set_xlim(*extent[:2])
+    ax.set_ylim(*extent[2:])
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # written aside and moved into place, as other workers may be reading it
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path), suffix=".png", delete=False
+    ) as partial:
+        fig.savefig(partial, format="png", dpi=MAP_DPI)
+    plt.close(fig)
+    os.replace(partial.name, path)
+
+
+def basemap_path(extent: tuple, year: int = None) -> str:
+    """The basemap for maps of a year, or of no year, rendering it if need be.
+
+    Years sharing the same city limits share a basemap. Basemaps belong to
+    a geodata generation, so are drawn afresh when the geodata changes.
+    """
+    city_limits = None
+    name = "areas"
+    if year:
+        city_limits = city_limits_for_year(year)
+        if len(city_limits):
+            name = "limits-{}".format(int(city_limits["year"].iloc[0]))
+    path = os.path.join(BASEMAP_DIR, str(geodata_generation()), name + ".png")
+    if not os.path.exists(path):
+        render_basemap(path, extent, city_limits)
+    return path
+
+
+def street_map(year: int = None):
+    """Start a map of streets over the basemap, for a year if given.
+
+    Returns the figure and the axes to draw streets on.
+    """
+    extent = map_extent()
+    fig, ax = blank_map(extent)
+    # drawn at the same size and resolution, so it goes down pixel for pixel,
+    # beneath the axes
+    fig.figimage(plt.imread(basemap_path(extent, year)), zorder=-1)
+    return fig, ax
+
+
+def street_geometries(street_ids):
+    """The best geometry of each of the streets, as one GeoSeries.
+
+    The stored geometries are fetched together; any that are stale are
+    worked out on the spot. Streets without a geometry are left out.
+    """
+    streets = load_street_geometries(street_ids)
+    for index in streets.index[streets["stale"]]:
+        geometry = Street.get_by_id(int(streets.at[index, "id"])).best_geometry()
+        streets.at[index, streets.geometry.name] = (
+            None if geometry is None else to_shape(geometry)
+        )
+    return streets.geometry[~streets.geometry.isna()]
+
+
+def save_map(fig, file, title: str = ""):
+    """Title a map and write it to a file as PNG, closing the figure."""
+    if title:
+        fig.text(0.5, TITLE_BAND / 2, title, ha="center", va="center")
+    fig.savefig(file, format="png", dpi=MAP_DPI)
+    plt.close(fig)
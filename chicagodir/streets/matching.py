@@ -0,0 +1,218 @@
+"""Match directory addresses to streets, many at a time."""
+
+from collections import defaultdict, namedtuple
+
+from chicagodir.streets.sorting import fix_street_name, fix_street_type
+
+MATCH_UNIQUE = "unique"
+MATCH_AMBIGUOUS = "ambiguous"
+MATCH_NONE = "none"
+
+# what the matcher needs to know about a street
+StreetRecord = namedtuple(
+    "StreetRecord", ["id", "name", "suffix", "direction", "start_year", "end_year"]
+)
+
+# how an address matched: the outcome, the street id if unique, the ids of
+# every street still in the running, and how many edits the name needed
+StreetMatch = namedtuple(
+    "StreetMatch", ["outcome", "street_id", "candidates", "distance"], defaults=[0]
+)
+
+
+def edit_distance(a: str, b: str, bound: int = None) -> int:
+    """Levenshtein distance between two strings.
+
+    With a bound, gives up as soon as the distance must exceed it, and
+    returns bound + 1.
+    """
+    if bound is not None and abs(len(a) - len(b)) > bound:
+        return bound + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if bound is not None and min(current) > bound:
+            return bound + 1
+        previous = current
+    if bound is not None:
+        return min(previous[-1], bound + 1)
+    return previous[-1]
+
+
+def fuzzy_bound(name: str) -> int:
+    """How many OCR errors to allow for in a name of this length."""
+    if len(name) <= 4:
+        return 1
+    if len(name) <= 9:
+        return 2
+    return 3
+
+
+class BKTree:
+    """A Burkhard-Keller tree of words, for finding those near a given word.
+
+    Each child hangs off its parent at their edit distance, so a search
+    only descends into children whose distance from the parent is within
+    the bound of the query's, by the triangle inequality.
+    """
+
+    def __init__(self, words=()):
+        """Build the tree from the given words."""
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str):
+        """Add a word to the tree."""
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            children = node[1]
+            if distance not in children:
+                children[distance] = (word, {})
+                return
+            node = children[distance]
+
+    def search(self, word: str, bound: int) -> "list[tuple[int, str]]":
+        """All words within bound edits of word, as (distance, word), nearest first."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_word, children = stack.pop()
+            distance = edit_distance(word, node_word)
+            if distance <= bound:
+                found.append((distance, node_word))
+            for child_distance, child in children.items():
+                if distance - bound <= child_distance <= distance + bound:
+                    stack.append(child)
+        return sorted(found)
+
+
+def _direction(direction) -> str:
+    """Normalise a directional prefix for comparison."""
+    return (direction or "").strip(".").upper().strip()
+
+
+def street_key(name, suffix, direction) -> tuple:
+    """The normalised name, suffix and direction an address is matched on.
+
+    Blank parts are None. Addresses are indexed by this key, so that those
+    a street edit may affect can be found without matching them all.
+    """
+    return (
+        fix_street_name(name) if name else None,
+        fix_street_type(suffix) if suffix else None,
+        _direction(direction) or None,
+    )
+
+
+class StreetMatcher:
+    """Resolves street names against an in-memory index of streets.
+
+    The index is built once, from StreetRecords, and then any number of
+    addresses can be matched against it without touching the database.
+    """
+
+    def __init__(self, records):
+        """Index the given streets by name."""
+        self.by_name = defaultdict(list)
+        for record in records:
+            self.by_name[record.name].append(record)
+        self._names_tree = None
+
+    @property
+    def names_tree(self) -> BKTree:
+        """A BK-tree of the known names, built the first time it is needed."""
+        if self._names_tree is None:
+            self._names_tree = BKTree(sorted(self.by_name))
+        return self._names_tree
+
+    def similar_names(self, name: str, bound: int = None, year: int = None):
+        """Known names within an edit-distance bound of a name, nearest first.
+
+        The bound defaults to fuzzy_bound of the name. With a year, only names
+        borne by a street that existed then are returned. Gives a list of
+        (distance, name).
+        """
+        name = fix_street_name(name)
+        if bound is None:
+            bound = fuzzy_bound(name)
+        return [
+            (distance, similar)
+            for distance, similar in self.names_tree.search(name, bound)
+            if year is None
+            or any(self.extant(record, year) for record in self.by_name[similar])
+        ]
+
+    def __len__(self):
+        """The number of streets indexed."""
+        return sum(len(records) for records in self.by_name.values())
+
+    @staticmethod
+    def extant(record, year: int) -> bool:
+        """Whether a street existed at some point in a year, as far as is known."""
+        return (record.start_year is None or record.start_year <= year) and (
+            record.end_year is None or year <= record.end_year
+        )
+
+    def match(
+        self, name, suffix="", direction="", year=None, fuzzy=False
+    ) -> StreetMatch:
+        """Find the one street an address refers to.
+
+        Streets sharing the name are narrowed down by suffix and then by
+        direction, as soon as a single street is left; a suffix or direction
+        that no street with the name has means there is no match. If several
+        streets remain, those that existed in the given year are preferred.
+
+        If fuzzy, a name that no street has is replaced by the nearest names,
+        within fuzzy_bound, of streets existing in the year.
+        """
+        if not name:
+            return StreetMatch(MATCH_NONE, None, ())
+        candidates = self.by_name.get(fix_street_name(name), [])
+        distance = 0
+        if not candidates and fuzzy:
+            similar = self.similar_names(name, year=year)
+            if similar:
+                distance = similar[0][0]
+                candidates = [
+                    record
+                    for near, similar_name in similar
+                    if near == distance
+                    for record in self.by_name[similar_name]
+                ]
+
+        if len(candidates) > 1 and suffix:
+            suffix = fix_street_type(suffix)
+            candidates = [c for c in candidates if c.suffix == suffix]
+        if len(candidates) > 1 and direction:
+            direction = _direction(direction)
+            candidates = [c for c in candidates if _direction(c.direction) == direction]
+        if len(candidates) > 1 and year is not None:
+            # street dates are best guesses, so only narrow if something is left
+            extant = [c for c in candidates if self.extant(c, year)]
+            candidates = extant or candidates
+
+        if not candidates:
+            return StreetMatch(MATCH_NONE, None, ())
+        if len(candidates) == 1:
+            return StreetMatch(
+                MATCH_UNIQUE, candidates[0].id, (candidates[0].id,), distance
+            )
+        return StreetMatch(
+            MATCH_AMBIGUOUS, None, tuple(sorted(c.id for c in candidates)), distance
+        )
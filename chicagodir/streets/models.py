@@ -7,19 +7,67 @@ import uuid
 
 from geoalchemy2 import Geometry
 from sqlalchemy import func, inspect
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, DATERANGE
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql import expression
 
-from chicagodir.database import Column, PkModel, db, reference_col, relationship
+from chicagodir.database import Column, Model, PkModel, db, reference_col, relationship
+from chicagodir.extensions import cache
 from chicagodir.streets.geodata import clip_by_address
+from chicagodir.streets.grid_inheritance import GridInfo, inherit_grid_info
+from chicagodir.streets.matching import StreetMatcher, StreetRecord
 from chicagodir.streets.sorting import (
     fix_street_name,
-    fix_street_type,
+    street_sort_string,
     street_title_case,
-    streets_sorted,
+    successor_display_name,
 )
 from chicagodir.streets.streetlist import StreetListEntry
 
+# bumped on every street edit; cache keys that include it go stale on edit
+EDIT_GENERATION_KEY = "streets/edit_generation"
+# when the edit generation was last bumped
+EDIT_TIME_KEY = "streets/edit_time"
+# per-year snapshots are also dropped after a day, to catch edits made outside the app
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+# where a street's derived geometry came from
+GEOMETRY_STORED = "stored"
+GEOMETRY_CLIPPED = "clipped"
+GEOMETRY_UNION = "union"
+GEOMETRY_NONE = "none"
+# the street columns that its derived geometry, or its predecessors', depends on
+GEOMETRY_INPUTS = ("geom", "min_address", "max_address", "direction", "current")
+# the street columns that matching directory addresses to it depends on
+MATCH_INPUTS = ("name", "suffix", "direction", "start_date", "end_date")
+
+
+def edit_generation() -> int:
+    """Return the current global street edit generation."""
+    return cache.get(EDIT_GENERATION_KEY) or 0
+
+
+def bump_edit_generation() -> int:
+    """Record that a street has been edited, invalidating cached snapshots."""
+    generation = cache.cache.inc(EDIT_GENERATION_KEY)
+    cache.set(EDIT_TIME_KEY, datetime.datetime.now(datetime.timezone.utc), timeout=0)
+    return generation
+
+
+def last_edit_time() -> "datetime.datetime | None":
+    """Return when the edit generation was last bumped, if known."""
+    return cache.get(EDIT_TIME_KEY)
+
+
+def changed_array_items(history) -> set:
+    """The items that an array attribute gained or lost, given its history."""
+    before = {item for value in history.deleted or () for item in value or ()}
+    before.update(item for value in history.unchanged or () for item in value or ())
+    after = {item for value in history.added or () for item in value or ()}
+    if not history.added:
+        after = before
+    return before ^ after
+
 
 class Street(PkModel):
     """A known historical or current street."""
@@ -39,6 +87,16 @@ class Street(PkModel):
     end_date_circa = Column(
         db.Boolean(), nullable=False, server_default=expression.false()
     )
+    # the days this street existed, unbounded where a date is unknown, and
+    # empty if the dates are the wrong way round, as no day is between them
+    lifetime = Column(
+        DATERANGE,
+        db.Computed(
+            "CASE WHEN start_date > end_date THEN 'empty'::daterange "
+            "ELSE daterange(start_date, end_date, '[]') END",
+            persisted=True,
+        ),
+    )
 
     # where on the grid (e.g. Foster is 5200 N)
     grid_location = Column(db.Integer(), nullable=True)
@@ -87,10 +145,37 @@ class Street(PkModel):
 
     successor_name = Column(db.String(80), nullable=True)
 
+    # natural sort order of name, suffix and direction; see street_sort_string
+    sort_key = Column(db.String(255, collation="C"), nullable=True)
+
     # add geometry
     geom = Column(Geometry("GEOMETRY", srid=3435))
 
-    __table_args__ = (db.Index("idx_streets_name_suff", "name", "suffix"),)
+    # the best geometry we have, stored or worked out from successors, and
+    # where it came from; the source is NULL while it needs recomputing
+    derived_geom = Column(Geometry("GEOMETRY", srid=3435))
+    derived_geom_source = Column(db.String(8), nullable=True, index=True)
+
+    __table_args__ = (
+        db.Index("idx_streets_name_suff", "name", "suffix"),
+        # trigram indexes serve ILIKE '%term%' and similarity searches
+        db.Index(
+            "idx_streets_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        db.Index(
+            "idx_streets_street_id_trgm",
+            "street_id",
+            postgresql_using="gin",
+            postgresql_ops={"street_id": "gin_trgm_ops"},
+        ),
+        # listings are ordered, and keyset-paginated, on (sort_key, id)
+        db.Index("idx_streets_sort_key_id", "sort_key", "id"),
+        db.Index("idx_streets_lifetime", "lifetime", postgresql_using="gist"),
+        db.Index("idx_streets_tags", "tags", postgresql_using="gin"),
+    )
 
     @classmethod
     def empty_street(cls):
@@ -109,6 +194,60 @@ class Street(PkModel):
         """Represent instance as a unique string."""
         return f"<Street({self.name})>"
 
+    def save(self, commit=True, changes=None):
+        """Save the record, keeping the stored sort key current.
+
+        A change to anything the derived geometry depends on marks it, and
+        that of every predecessor, as needing to be recomputed. The counts
+        of any tags added or removed are brought up to date. changes, from
+        pending_changes, are what was changed, if taken earlier. The edit
+        generation is bumped only once the edit is committed; a caller that
+        passes commit=False bumps it after its own commit.
+        """
+        self.sort_key = street_sort_string(self)
+        if changes is None:
+            changes = self.pending_changes()
+        geometry_changed = any(attr in changes for attr in GEOMETRY_INPUTS)
+        changed_tags = changed_array_items(changes["tags"]) if "tags" in changes else ()
+        result = super().save(commit=False)
+        if geometry_changed:
+            self.derived_geom_source = None
+            db.session.flush()
+            Street.invalidate_derived_geometry(self.id)
+        if changed_tags:
+            db.session.flush()
+            StreetTag.refresh(changed_tags)
+        if commit:
+            db.session.commit()
+            bump_edit_generation()
+        return result
+
+    def pending_changes(self) -> dict:
+        """The history of every attribute changed and not yet flushed, by name.
+
+        A flush, which any query may set off, forgets what was changed, so
+        an edit saved in several steps takes this first, and passes it to
+        save, record_changes and match_names_changed.
+        """
+        return {
+            attr.key: attr.history
+            for attr in inspect(self).attrs
+            if attr.history.has_changes()
+        }
+
+    def match_names_changed(self, changes=None) -> list:
+        """The street's old and new names, if what addresses match on has changed.
+
+        changes are from pending_changes, by default taken now. If nothing
+        addresses are matched on has changed, the list is empty.
+        """
+        if changes is None:
+            changes = self.pending_changes()
+        if not any(attr in changes for attr in MATCH_INPUTS):
+            return []
+        old_names = changes["name"].deleted if "name" in changes else ()
+        return sorted({self.name, *old_names} - {None})
+
     @property
     def full_name(self) -> str:
         """The full name of the street."""
@@ -131,18 +270,52 @@ class Street(PkModel):
             ]
         )
 
-    def find_current_successors(self, n=0):
-        """Follow the chain of street changes all the way to the end."""
-        if n > 5:
-            # don't recurse more than 5 times
-            return set()
-        elif self.current:
+    def find_current_successors(self):
+        """Follow the chain of street changes all the way to the end.
+
+        The chain stops at the first current street along each path, so a
+        current street reached only through another current one is left out;
+        one that can also be reached some other way is kept.
+
+        StreetLineage can't answer this: it records that one street leads to
+        another, not whether any path between them avoids every current
+        street. So the changes themselves are walked, only through streets
+        that are not current, to the same depth the lineage is built to.
+        """
+        if self.current:
             return {self}
-        else:
-            found = set()
-            for street in self.successor_streets:
-                found = found.union(street.find_current_successors(n + 1))
-            return found
+        walk = (
+            db.select(
+                StreetChange.to_id.label("street_id"), db.literal(1).label("depth")
+            )
+            .filter(StreetChange.from_id == self.id)
+            .filter(StreetChange.to_id.isnot(None))
+            .cte("walk", recursive=True)
+        )
+        through = db.aliased(Street)
+        step = db.aliased(StreetChange)
+        walk = walk.union(
+            db.select(step.to_id, walk.c.depth + 1)
+            .join(through, through.id == walk.c.street_id)
+            .join(step, step.from_id == through.id)
+            .filter(through.current.is_(False))
+            .filter(step.to_id.isnot(None))
+            .filter(walk.c.depth < LINEAGE_MAX_DEPTH)
+        )
+        return set(
+            Street.query.join(walk, walk.c.street_id == Street.id).filter(
+                Street.current.is_(True)
+            )
+        )
+
+    def all_predecessors(self) -> "list[Street]":
+        """Every street that this street succeeded, at any remove, nearest first."""
+        return (
+            Street.query.join(StreetLineage, StreetLineage.ancestor_id == Street.id)
+            .filter(StreetLineage.descendant_id == self.id)
+            .order_by(StreetLineage.depth, Street.sort_key, Street.id)
+            .all()
+        )
 
     @property
     def successor_streets(self) -> "list[Street]":
@@ -154,9 +327,12 @@ class Street(PkModel):
         if self.geom:
             return self.geom
         else:
+            successor_ids = db.select(StreetChange.to_id).filter(
+                StreetChange.from_id == self.id
+            )
             return (
                 db.session.query(func.ST_SetSRID(func.ST_Union(Street.geom), 3435))
-                .filter(Street.id.in_([street.id for street in self.successor_streets]))
+                .filter(Street.id.in_(successor_ids))
                 .scalar()
             )
 
@@ -189,9 +365,65 @@ class Street(PkModel):
                         self.max_address,
                     )
 
+    def derive_geometry(self):
+        """Work out the specific geometry, or else the full one, and where it came from."""
+        if self.geom:
+            return self.geom, GEOMETRY_STORED
+        specific = self.specific_geometry()
+        if specific is not None:
+            return specific, GEOMETRY_CLIPPED
+        full = self.full_geometry()
+        if full is not None:
+            return full, GEOMETRY_UNION
+        return None, GEOMETRY_NONE
+
     def best_geometry(self):
-        """Return either the specific geometry or the full geometry."""
-        return self.specific_geometry() or self.full_geometry()
+        """Return either the specific geometry or the full geometry.
+
+        This is the derived geometry stored with the street, unless that is
+        waiting to be recomputed, when it is worked out on the spot.
+        """
+        if self.derived_geom_source is None:
+            return self.derive_geometry()[0]
+        return self.derived_geom
+
+    def refresh_derived_geometry(self):
+        """Recompute and store the derived geometry."""
+        self.derived_geom, self.derived_geom_source = self.derive_geometry()
+
+    @classmethod
+    def invalidate_derived_geometry(cls, street_id: int):
+        """Mark a street, and every street it succeeded, as needing its geometry recomputed."""
+        ancestors = db.select(StreetLineage.ancestor_id).filter(
+            StreetLineage.descendant_id == street_id
+        )
+        db.session.query(Street).filter(
+            (Street.id == street_id) | Street.id.in_(ancestors)
+        ).update({Street.derived_geom_source: None}, synchronize_session=False)
+
+    @classmethod
+    def refresh_stale_geometry(cls, batch_size: int = 100) -> int:
+        """Recompute the derived geometry of every street marked as needing it.
+
+        Returns how many streets were recomputed.
+        """
+        refreshed = 0
+        while True:
+            streets = (
+                Street.query.filter(Street.derived_geom_source.is_(None))
+                .order_by(Street.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not streets:
+                break
+            for street in streets:
+                street.refresh_derived_geometry()
+            db.session.commit()
+            refreshed += len(streets)
+        if refreshed:
+            bump_edit_generation()
+        return refreshed
 
     def calculate_single_successor(self):
         """If this is succeeded by a single street, store its name and suffix."""
@@ -205,9 +437,62 @@ class Street(PkModel):
         )
 
         if len(q) == 1:
-            self.successor_name = "{} {}".format(
-                street_title_case(q[0].name.title()), q[0].suffix.capitalize()
+            self.successor_name = successor_display_name(q[0].name, q[0].suffix)
+
+    @classmethod
+    def recalculate_successor_names(cls, since: datetime.datetime = None) -> int:
+        """Recompute successor_name in bulk, returning how many streets changed.
+
+        Streets whose successors share a single name and suffix get it, as
+        calculate_single_successor gives them; any other street keeps the
+        successor_name it has, which may have been set by hand. With since,
+        only streets edited since then, and the streets they succeed, are
+        looked at.
+        """
+        in_scope = db.true()
+        if since is not None:
+            edited = db.select(StreetEdit.street_id).filter(
+                StreetEdit.timestamp >= since
             )
+            in_scope = Street.id.in_(edited) | Street.id.in_(
+                db.select(StreetChange.from_id).filter(StreetChange.to_id.in_(edited))
+            )
+
+        single_successors = (
+            db.session.query(
+                StreetChange.from_id, func.min(Street.name), func.min(Street.suffix)
+            )
+            .join(Street, Street.id == StreetChange.to_id)
+            .filter(StreetChange.from_id.in_(db.select(Street.id).filter(in_scope)))
+            .group_by(StreetChange.from_id)
+            .having(func.count(db.distinct(db.tuple_(Street.name, Street.suffix))) == 1)
+        )
+        new_names = {
+            street_id: successor_display_name(name, suffix)
+            for street_id, name, suffix in single_successors
+        }
+
+        current_names = db.session.query(Street.id, Street.successor_name).filter(
+            Street.id == db.any_(db.literal(list(new_names), ARRAY(db.Integer)))
+        )
+        changes = {
+            street_id: new_names[street_id]
+            for street_id, successor_name in current_names
+            if successor_name != new_names[street_id]
+        }
+        if changes:
+            db.session.execute(
+                db.text(
+                    """UPDATE streets SET successor_name = changes.successor_name
+                    FROM unnest(CAST(:ids AS integer[]), CAST(:names AS text[]))
+                        AS changes(id, successor_name)
+                    WHERE streets.id = changes.id"""
+                ),
+                {"ids": list(changes), "names": list(changes.values())},
+            )
+            db.session.commit()
+            bump_edit_generation()
+        return len(changes)
 
     def get_grid_location_from_successors(self):
         """Figure out our grid location based on our successor streets."""
@@ -225,6 +510,54 @@ class Street(PkModel):
         if any(x.diagonal for x in successors):
             self.diagonal = True
 
+    @classmethod
+    def inherit_all_grid_locations(cls) -> int:
+        """Inherit grid positions for every street, returning how many changed.
+
+        The whole street change graph is read in two queries and worked
+        through in memory, successors first; the results are written back in
+        one statement and one transaction.
+        """
+        info = {
+            street_id: GridInfo(*values)
+            for street_id, *values in db.session.query(
+                Street.id,
+                Street.current,
+                Street.diagonal,
+                Street.grid_direction,
+                Street.grid_location,
+            )
+        }
+        edges = {}
+        for from_id, to_id in db.session.query(
+            StreetChange.from_id, StreetChange.to_id
+        ).filter(StreetChange.to_id.isnot(None)):
+            edges.setdefault(from_id, set()).add(to_id)
+
+        changes = sorted(inherit_grid_info(info, edges).items())
+        if changes:
+            db.session.execute(
+                db.text(
+                    """UPDATE streets SET diagonal = changes.diagonal,
+                        grid_direction = changes.grid_direction,
+                        grid_location = changes.grid_location
+                    FROM unnest(CAST(:ids AS integer[]), CAST(:diagonals AS boolean[]),
+                                CAST(:directions AS text[]),
+                                CAST(:locations AS integer[]))
+                        AS changes(id, diagonal, grid_direction, grid_location)
+                    WHERE streets.id = changes.id"""
+                ),
+                {
+                    "ids": [street_id for street_id, _ in changes],
+                    "diagonals": [bool(grid.diagonal) for _, grid in changes],
+                    "directions": [grid.grid_direction for _, grid in changes],
+                    "locations": [grid.grid_location for _, grid in changes],
+                },
+            )
+            db.session.commit()
+            bump_edit_generation()
+        return len(changes)
+
     @property
     def predecessors(self) -> "list[Street]":
         """A list of predecessor streets."""
@@ -348,48 +681,73 @@ class Street(PkModel):
             q.filter(
                 ((Street.end_date >= self.start_date) | (Street.end_date.is_(None)))
             )
-        return q.all()
+        return q.order_by(Street.sort_key, Street.id).all()
 
     @classmethod
     def streets_given_date(cls, date):
         """Given a date, find all contemporaneous streets."""
         q = db.session.query(Street)
         if date is not None:
-            q.filter(((Street.start_date <= date) | (Street.start_date.is_(None))))
-            q.filter(((Street.end_date >= date) | (Street.end_date.is_(None))))
+            q = q.filter(Street.lifetime.contains(date))
         return q.all()
 
     @classmethod
-    def find_best_street(cls, name, suffix="", direction="", year=None):
-        """Given details, find the one matching street, if any."""
-        print("looking for", direction, name, suffix, year)
-        name = fix_street_name(name)
-        matched_streets = Street.query.filter(Street.name == name).all()
-        print("found", repr(name), len(matched_streets))
-        if len(matched_streets) == 1:
-            return matched_streets[0]
-        else:
-            if suffix:
-                matched_streets = list(
-                    filter(
-                        lambda x: x.suffix == fix_street_type(suffix), matched_streets
-                    )
-                )
-            if len(matched_streets) == 1:
-                return matched_streets[0]
-            if direction:
-                matched_streets = list(
-                    filter(lambda x: x.direction == direction, matched_streets)
+    def street_ids_given_year(cls, year: int) -> "list[int]":
+        """Ids of the streets extant at the start of a year.
+
+        Snapshots are cached per year and per edit generation, so any edit
+        to a street retires all of them.
+        """
+        key = "streets/extant/{}/{}".format(year, edit_generation())
+        ids = cache.get(key)
+        if ids is None:
+            first_of_year = datetime.date(month=1, day=1, year=year)
+            ids = [
+                street_id
+                for (street_id,) in db.session.query(Street.id).filter(
+                    Street.lifetime.contains(first_of_year)
                 )
-            if len(matched_streets) == 1:
-                return matched_streets[0]
-        print("too many:", matched_streets)
+            ]
+            cache.set(key, ids, timeout=SNAPSHOT_TIMEOUT)
+        return ids
+
+    @classmethod
+    def extant_in_year(cls, year: int):
+        """Filter clause for streets extant at the start of a year, using the snapshot cache."""
+        ids = cls.street_ids_given_year(year)
+        return cls.id == db.any_(db.literal(ids, ARRAY(db.Integer)))
+
+    @classmethod
+    def street_matcher(cls, names=None) -> StreetMatcher:
+        """Build a matcher over every street, or only those with the given names."""
+        q = db.session.query(
+            Street.id,
+            Street.name,
+            Street.suffix,
+            Street.direction,
+            db.extract("year", Street.start_date),
+            db.extract("year", Street.end_date),
+        )
+        if names is not None:
+            q = q.filter(Street.name.in_({fix_street_name(n) for n in names if n}))
+        return StreetMatcher(
+            StreetRecord(
+                street_id,
+                name,
+                suffix,
+                direction,
+                None if start_year is None else int(start_year),
+                None if end_year is None else int(end_year),
+            )
+            for street_id, name, suffix, direction, start_year, end_year in q
+        )
 
     def record_edit(self, user, change: str):
         """Record that an edit has been made to this street by a user."""
         change_object = StreetEdit(street=self, user=user, note=change)
 
         change_object.save()
+        bump_edit_generation()
 
     def data_issues(self) -> list:
         """Report out the data issues with this street that a user might like to fix."""
@@ -453,15 +811,15 @@ class Street(PkModel):
 
         return issues
 
-    def record_changes(self, current_user):
-        """Inspect using sqlalchemy and record changes."""
-        changes = {}
-
-        for attr in inspect(self).attrs:
-            if attr.history.has_changes():
-                changes[attr.key] = attr.history.added
+    def record_changes(self, current_user, changes=None):
+        """Record the changes, from pending_changes, by default taken now."""
+        if changes is None:
+            changes = self.pending_changes()
         if changes:
-            self.record_edit(current_user, str(changes))
+            self.record_edit(
+                current_user,
+                str({key: history.added for key, history in changes.items()}),
+            )
 
     @property
     def timestamp(self) -> datetime.datetime:
@@ -479,6 +837,7 @@ class Street(PkModel):
         """Return list of street lists in which this street appears."""
         results = (
             db.session.query(StreetListEntry)
+            .options(db.joinedload(StreetListEntry.list))
             .filter(StreetListEntry.street_id == self.id)
             .all()
         )
@@ -495,30 +854,77 @@ class Street(PkModel):
             i += 1
         self.street_id = "{:.8}_{:02}".format(self.name, i)
 
-    def stored_maps(self):
-        """Return the list of stored maps that this street might appear on."""
+    def stored_maps(self, geometry=None):
+        """Return the list of stored maps that this street might appear on.
+
+        Pass the street's best geometry, if already at hand, to save working
+        it out again.
+        """
+        if geometry is None:
+            geometry = self.best_geometry()
         early, late = self.year_range()
         q = (
             db.session.query(StoredMap)
             .filter(StoredMap.year >= early)
             .filter(StoredMap.year <= late)
-            .filter(func.ST_Intersects(StoredMap.geom, self.best_geometry()))
+            .filter(func.ST_Intersects(StoredMap.geom, geometry))
             .order_by(StoredMap.year)
         )
         return q.all()
 
-    def annexations(self):
-        """Return the annexation that this street might appear on."""
+    def annexations(self, geometry=None):
+        """Return the annexation that this street might appear on.
+
+        As with stored_maps, the best geometry can be passed in.
+        """
+        if geometry is None:
+            geometry = self.best_geometry()
         early, late = self.year_range()
         q = (
             db.session.query(Annexation)
             .filter(Annexation.year >= early)
             .filter(Annexation.year <= late)
-            .filter(func.ST_Covers(Annexation.geom, self.best_geometry()))
+            .filter(func.ST_Covers(Annexation.geom, geometry))
             .order_by(Annexation.year)
         )
         return q.all()
 
+    def page_context(self) -> dict:
+        """Everything the street page shows, each loaded exactly once.
+
+        Related streets and edit authors are loaded along with the changes
+        and edits that refer to them, and the successor changes are also
+        installed as the street's successors, which data_issues looks at.
+        """
+        successor_changes = (
+            self.successor_changes()
+            .options(db.joinedload(StreetChange.to_street))
+            .order_by(StreetChange.id)
+            .all()
+        )
+        set_committed_value(self, "successors", successor_changes)
+        predecessor_changes = (
+            self.predecessor_changes()
+            .options(db.joinedload(StreetChange.from_street))
+            .order_by(StreetChange.id)
+            .all()
+        )
+        geometry = self.best_geometry()
+        return {
+            "successor_changes": successor_changes,
+            "predecessor_changes": predecessor_changes,
+            "street_lists": self.street_lists(),
+            "stored_maps": self.stored_maps(geometry) if geometry is not None else [],
+            "annexations": self.annexations(geometry) if geometry is not None else [],
+            "data_issues": self.data_issues(),
+            "similar_streets": self.similar_streets().order_by(Street.id).all(),
+            "aligned_streets": self.streets_with_same_grid(),
+            "edits": StreetEdit.query.options(db.joinedload(StreetEdit.user))
+            .filter(StreetEdit.street_id == self.id)
+            .order_by(StreetEdit.id.desc())
+            .all(),
+        }
+
     def streets_with_same_grid(self):
         """Return the list of streets that are on the same line."""
         if not (self.grid_direction and self.grid_location):
@@ -529,8 +935,9 @@ class Street(PkModel):
             .filter(Street.grid_direction == self.grid_direction)
             .filter(Street.diagonal == self.diagonal)
             .filter(Street.id != self.id)
+            .order_by(Street.sort_key, Street.id)
         )
-        return streets_sorted(q.all())
+        return q.all()
 
 
 class StreetChange(PkModel):
@@ -551,6 +958,118 @@ class StreetChange(PkModel):
     date = Column(db.Date(), nullable=True)
 
 
+class StreetLineage(Model):
+    """The transitive closure of street changes.
+
+    There is a row for every street that is a successor of another, however
+    many changes removed, at the depth of the shortest chain between them.
+    """
+
+    __tablename__ = "street_lineage"
+
+    ancestor_id = reference_col("streets", column_kwargs={"primary_key": True})
+    descendant_id = reference_col(
+        "streets", column_kwargs={"primary_key": True, "index": True}
+    )
+    depth = Column(db.Integer(), nullable=False)
+
+    @classmethod
+    def rebuild(cls, ancestor_ids=None):
+        """Recompute the lineage of the given streets, or of every street."""
+        if ancestor_ids is None:
+            cls.query.delete(synchronize_session=False)
+            starting_changes = ""
+        else:
+            ancestor_ids = list(ancestor_ids)
+            cls.query.filter(cls.ancestor_id.in_(ancestor_ids)).delete(
+                synchronize_session=False
+            )
+            starting_changes = "AND from_id = ANY(:ancestor_ids)"
+
+        db.session.execute(
+            db.text(LINEAGE_SQL.format(starting_changes=starting_changes)),
+            {"ancestor_ids": ancestor_ids, "max_depth": LINEAGE_MAX_DEPTH},
+        )
+        db.session.commit()
+
+    @classmethod
+    def refresh(cls, street_id: int):
+        """Update the lineage after successors of a street were added or removed.
+
+        Only the street itself and the streets that precede it can have
+        gained or lost descendants.
+        """
+        ancestor_ids = {street_id}
+        ancestor_ids.update(
+            ancestor_id
+            for (ancestor_id,) in db.session.query(cls.ancestor_id).filter(
+                cls.descendant_id == street_id
+            )
+        )
+        cls.rebuild(ancestor_ids)
+
+
+class StreetTag(Model):
+    """How many streets carry each tag, kept up to date as streets are saved."""
+
+    __tablename__ = "street_tags"
+
+    tag = Column(db.String(), primary_key=True)
+    street_count = Column(db.Integer(), nullable=False)
+
+    @classmethod
+    def refresh(cls, tags):
+        """Recount the streets carrying each of the given tags.
+
+        Each count is one lookup in the GIN index on streets.tags; tags no
+        longer on any street are dropped.
+        """
+        db.session.execute(db.text(TAG_COUNT_SQL), {"tags": sorted(tags)})
+        cls.query.filter(cls.street_count == 0).delete(synchronize_session=False)
+
+    @classmethod
+    def rebuild(cls):
+        """Recount every tag from scratch."""
+        cls.query.delete(synchronize_session=False)
+        db.session.execute(db.text(ALL_TAG_COUNTS_SQL))
+        db.session.commit()
+
+
+TAG_COUNT_SQL = """
+INSERT INTO street_tags (tag, street_count)
+SELECT affected.tag, count(streets.id)
+FROM unnest(CAST(:tags AS varchar[])) AS affected(tag)
+LEFT JOIN streets ON streets.tags @> ARRAY[affected.tag]
+GROUP BY affected.tag
+ON CONFLICT (tag) DO UPDATE SET street_count = EXCLUDED.street_count
+"""
+
+ALL_TAG_COUNTS_SQL = """
+INSERT INTO street_tags (tag, street_count)
+SELECT tag, count(DISTINCT id) FROM streets, unnest(tags) AS tag
+GROUP BY tag
+"""
+
+
+# bounds the walk, in case of cycles in the street changes
+LINEAGE_MAX_DEPTH = 50
+
+LINEAGE_SQL = """
+WITH RECURSIVE walk(ancestor_id, descendant_id, depth) AS (
+        SELECT from_id, to_id, 1 FROM streetchange
+        WHERE to_id IS NOT NULL {starting_changes}
+    UNION
+        SELECT walk.ancestor_id, streetchange.to_id, walk.depth + 1
+        FROM walk JOIN streetchange ON streetchange.from_id = walk.descendant_id
+        WHERE streetchange.to_id IS NOT NULL AND walk.depth < :max_depth
+)
+INSERT INTO street_lineage (ancestor_id, descendant_id, depth)
+SELECT ancestor_id, descendant_id, min(depth) FROM walk
+WHERE ancestor_id <> descendant_id
+GROUP BY ancestor_id, descendant_id
+"""
+
+
 class StreetEdit(PkModel):
     """A record of a user or system edit to a street in this database."""
 
@@ -2,6 +2,9 @@
 
 import re
 
+# width numbers are padded to in stored sort keys
+SORT_KEY_DIGITS = 10
+
 post_type_map = {
     "AY": "AVE",
     "AV": "AVE",
@@ -39,13 +42,36 @@ def natural_keys(text):
     return [atoi(c) for c in re.split(r"(\d+)", text)]
 
 
-def street_key(street):
-    """Given a street object, return an appropriate sorting key."""
-    return natural_keys(
+def natural_sort_string(text):
+    r"""Encode natural_keys(text) as a string that sorts the same way bytewise.
+
+    Numbers are zero-padded to a fixed width and every run of text is
+    terminated with a \x01 byte, so that a run sorts before any longer run it is a
+    prefix of. Compare with a "C" collation for the ordering to hold.
+    """
+    return "".join(
+        str(key).zfill(SORT_KEY_DIGITS) if isinstance(key, int) else key + "\x01"
+        for key in natural_keys(text)
+    )
+
+
+def street_sort_text(street):
+    """Given a street object, return the text its sort keys are built from."""
+    return (
         street.name + " " + str(street.suffix or "") + " " + str(street.direction or "")
     )
 
 
+def street_key(street):
+    """Given a street object, return an appropriate sorting key."""
+    return natural_keys(street_sort_text(street))
+
+
+def street_sort_string(street):
+    """Given a street object, return a sorting key suitable for storing in the database."""
+    return natural_sort_string(street_sort_text(street))
+
+
 def streets_sorted(streets):
     """Sort street objects using appropriate key."""
     return sorted(streets, key=street_key)
@@ -98,3 +124,10 @@ def fix_street_name(raw_street_name: str) -> str:
 def street_title_case(raw_street_name: str) -> str:
     """Put a street name back into title case."""
     return " ".join(x.capitalize() for x in re.split(r"(\s+)", raw_street_name))
+
+
+def successor_display_name(name: str, suffix: str) -> str:
+    """Format a successor street's name and suffix for display after a retired street."""
+    return "{} {}".format(
+        street_title_case(name.title()), (suffix or "").capitalize()
+    ).strip()
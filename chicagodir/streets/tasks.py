@@ -1,31 +1,38 @@
 """Tasks that workers can perform on streets."""
 
+import datetime
 import logging
 import subprocess
 from tempfile import NamedTemporaryFile
 
 import boto3
 import geopandas as gpd
-import matplotlib.pyplot as plt
 from environs import Env
 from geoalchemy2.shape import to_shape
 
 from chicagodir.database import db
+from chicagodir.jobs import MAPS_QUEUE, JobRequest, dispatch
 from chicagodir.streets.geodata import (
     ALL_CA_TAGS,
-    find_city_limits_for_year,
+    areas_intersecting,
+    city_limits_for_year,
     find_community_areas,
-    load_areas,
 )
+from chicagodir.streets.maps import save_map, street_geometries, street_map
 from chicagodir.streets.models import Street
-from chicagodir.streets.streetlist import StreetList
-
-# from chicagodir.database import db
+from chicagodir.streets.streetlist import StreetList, StreetListEntry
 
 env = Env()
 env.read_env()
 
 
+def refresh_stale_geometry():
+    """Recompute the derived geometry of streets whose inputs have changed."""
+    refreshed = Street.refresh_stale_geometry()
+    logging.info("%s street geometries recomputed", refreshed)
+    return refreshed
+
+
 def refresh_community_area_tags(street_id: str):
     """Given a street that has just been edited, recalcuate which CAs it passes through."""
     street = Street.query.filter_by(street_id=street_id).one()
@@ -57,6 +64,13 @@ def calc_successor_info(street_id: str):
     d.save()
 
 
+def recalc_all_successor_info(since: datetime.datetime = None):
+    """Recompute successor names for all streets, or those edited since a time."""
+    changed = Street.recalculate_successor_names(since=since)
+    logging.info("%s successor names changed", changed)
+    return changed
+
+
 def inherit_grid(street_id: str):
     """Using street sucessors, reverse-inherit a grid location."""
     d = Street.query.filter_by(street_id=street_id).one()
@@ -65,44 +79,53 @@ def inherit_grid(street_id: str):
     d.save()
 
 
+def inherit_all_grids():
+    """Reverse-inherit grid locations for every street at once."""
+    changed = Street.inherit_all_grid_locations()
+    logging.info("%s streets inherited a grid location", changed)
+    return changed
+
+
 def redraw_map_for_street(street_id: str):
     """Regenerate the map for a street."""
     street = Street.query.filter_by(street_id=street_id).one()
 
-    areas = load_areas()
-    my_map = areas.boundary.plot(color="grey", linewidth=0.25)
-    my_map.set_axis_off()
+    my_map_figure, my_map = street_map()
 
     street_color = "black"
     full_extent, clipped_extent = street.full_geometry(), street.specific_geometry()
     if clipped_extent is not None:
-        active_cas = load_areas(clipped_extent)
+        active_cas = areas_intersecting(clipped_extent)
         active_cas.plot(ax=my_map, color="pink")
 
     if street.current:
-        plt.title(street.full_name, y=-0.01)
+        title = street.full_name
         plotting_df = gpd.GeoSeries([to_shape(full_extent)])
         plotting_df.plot(ax=my_map, color=street_color)
     else:
-        plt.title(street.context_info, y=-0.01)
+        title = street.context_info
         plotting_df = gpd.GeoSeries([to_shape(full_extent), to_shape(clipped_extent)])
         plotting_df.plot(ax=my_map, color=[street_color, "red"])
 
-    plt.tight_layout()
-
     with NamedTemporaryFile(suffix=".png") as tempfile:
-        plt.savefig(tempfile, format="png", dpi=200)
-        plt.close()
+        save_map(my_map_figure, tempfile, title)
+        tempfile.flush()
         process_and_upload_png(tempfile, "streets/maps/{}.png".format(street.street_id))
 
 
 def redraw_map_for_streetlist(streetlist_id: int):
     """Regenerate the map for a streetlist."""
     streetlist = StreetList.query.filter_by(id=streetlist_id).one()
-    streets = streetlist.sorted_streets()
+    street_ids = [
+        street_id
+        for (street_id,) in db.session.query(StreetListEntry.street_id).filter(
+            StreetListEntry.list_id == streetlist.id,
+            StreetListEntry.street_id.isnot(None),
+        )
+    ]
     url = "streets/lists/maps/{}.png".format(streetlist.id)
     redraw_map_for_list_of_streets(
-        streets,
+        street_ids,
         url,
         year=streetlist.date.year,
         title=f"{streetlist.name} ({streetlist.date.year})",
@@ -110,18 +133,31 @@ def redraw_map_for_streetlist(streetlist_id: int):
 
 
 def redraw_affected_tags(street_id: str):
-    """Redraw maps for all tags of this street."""
+    """Have the maps for all tags of this street redrawn.
+
+    Each tag is its own job, keyed by tag, so the maps are drawn in parallel
+    and edits to several streets sharing a tag redraw its map once.
+    """
     street = Street.query.filter_by(street_id=street_id).one()
-    for tag in street.tags:
-        redraw_map_for_tag(tag)
+    dispatch(
+        [
+            JobRequest(redraw_map_for_tag, (tag,), key=tag, queue=MAPS_QUEUE)
+            for tag in street.tags
+        ]
+    )
 
 
 def redraw_map_for_tag(tag: str):
     """Regenerate the map for streets with this tag."""
-    streets = db.session.query(Street).filter(Street.tags.contains([tag])).all()
+    street_ids = [
+        street_id
+        for (street_id,) in db.session.query(Street.id).filter(
+            Street.tags.contains([tag])
+        )
+    ]
     url = "streets/lists/maps/tag/{}.png".format(tag)
     redraw_map_for_list_of_streets(
-        streets,
+        street_ids,
         url,
         street_color="red",
         street_width=0.75,
@@ -130,57 +166,39 @@ def redraw_map_for_tag(tag: str):
 
 
 def redraw_map_for_list_of_streets(
-    streets: list[Street],
+    street_ids: list[int],
     url: str,
     street_color: str = "black",
     street_width: float = 0.5,
     title: str = "",
     year: int = None,
 ):
-    """Given list of streets, regenerate the map."""
+    """Given the ids of a list of streets, regenerate the map.
 
-    areas = load_areas()
+    The streets are drawn together, in one pass.
+    """
+    my_map_figure, my_map = street_map(year)
+    streets = street_geometries(street_ids)
+    logging.debug("redrawing %s streets", len(streets))
 
-    if year:
+    if year and len(streets):
         # everything outside of the contemporary city limits will be faded out
-        city_limits = find_city_limits_for_year(year)
-        my_map = city_limits.plot(facecolor="wheat", edgecolor="none")
-        areas.boundary.plot(ax=my_map, color="grey", linewidth=0.25)
-        # areas.clip(city_limits).boundary.plot(ax=my_map, color="grey", linewidth=0.25)
-    else:
-        my_map = areas.boundary.plot(color="grey", linewidth=0.25)
-
-    my_map.set_axis_off()
-
-    for street in streets:
-        logging.debug("redrawing %s", street.street_id)
-        street_data = street.best_geometry()
-        # logging.error("best geom: %s", street_data)
-        if street_data is not None:
-            plotting_df = gpd.GeoSeries([to_shape(street_data)])
-
-            if year:
-                plotting_df.plot(ax=my_map, color="darkgrey", linewidth=street_width)
-                plotting_df.clip(city_limits).plot(
-                    ax=my_map, color=street_color, linewidth=street_width
-                )
-            else:
-                plotting_df.plot(ax=my_map, color=street_color, linewidth=street_width)
-
-    if title:
-        plt.title(title, y=-0.01)
-
-    plt.tight_layout()
+        streets.plot(ax=my_map, color="darkgrey", linewidth=street_width)
+        streets = streets.clip(city_limits_for_year(year))
+    if len(streets):
+        streets.plot(ax=my_map, color=street_color, linewidth=street_width)
 
     with NamedTemporaryFile(suffix=".png") as tempfile:
-        plt.savefig(tempfile, format="png", dpi=200)
-        plt.close()
+        save_map(my_map_figure, tempfile, title)
+        tempfile.flush()
         process_and_upload_png(tempfile, url)
 
 
 def process_and_upload_png(tempfile, url: str):
-    """Get that png ready and upload it."""
-    subprocess.run(["mogrify", "-trim", "+repage", tempfile.name])
+    """Get that png ready and upload it.
+
+    Maps share a fixed extent, so there is no border to trim, only bytes.
+    """
     subprocess.run(["optipng", "-quiet", tempfile.name])
 
     linode_obj_config = {
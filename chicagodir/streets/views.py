@@ -1,29 +1,47 @@
 # -*- coding: utf-8 -*-
 """Public section, including homepage and signup."""
 import datetime
-import io
+import hashlib
 
 import markdown
-import redis
 from flask import (
     Blueprint,
+    Response,
     abort,
     current_app,
     jsonify,
-    make_response,
     redirect,
     render_template,
     request,
+    session,
+    stream_template,
+    stream_with_context,
     url_for,
 )
 from flask_login import current_user, login_required
-from rq import Connection, Queue
 from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
+from werkzeug.http import is_resource_modified
 
 from chicagodir.database import db
 from chicagodir.directory.forms import StreetListForm
-from chicagodir.streets.models import Street, StreetChange
-from chicagodir.streets.sorting import streets_sorted
+from chicagodir.extensions import cache
+from chicagodir.jobs import FAST_QUEUE, MAPS_QUEUE, JobRequest, dispatch
+from chicagodir.streets.export import (
+    csv_chunks,
+    geojsonl_chunks,
+    geoparquet_chunks,
+    gzip_chunks,
+)
+from chicagodir.streets.models import (
+    Street,
+    StreetChange,
+    StreetEdit,
+    StreetLineage,
+    StreetTag,
+    bump_edit_generation,
+    edit_generation,
+    last_edit_time,
+)
 from chicagodir.streets.streetlist import StreetList, StreetListEntry
 
 from .forms import StreetEditForm, StreetSearchForm
@@ -34,10 +52,18 @@ from .tasks import (
     redraw_map_for_street,
     redraw_map_for_streetlist,
     refresh_community_area_tags,
+    refresh_stale_geometry,
 )
 
 blueprint = Blueprint("street", __name__, static_folder="../static")
 
+# rendered pages are dropped after a day even if nothing is edited
+PAGE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# streets per page of the paginated listing
+LISTING_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
 # lifted from sqlalchemy_utils
 # \ is the escape character postgres defaults to
 def escape_like(string, escape_char="\\"):
@@ -64,6 +90,71 @@ def escape_like(string, escape_char="\\"):
     )
 
 
+def cached_page(key: str, timestamp, render):
+    """Serve a public page conditionally, and from the HTML cache when possible.
+
+    key names the page; together with the edit timestamp and the global edit
+    generation it makes up the cache key and the ETag, so any edit retires
+    both. Logged-in users see their own controls on pages, and flashed
+    messages are for one visitor only, so those requests are rendered afresh.
+    """
+    if (
+        request.method != "GET"
+        or current_user.is_authenticated
+        or session.get("_flashes")
+    ):
+        return render()
+
+    key = "pages/{}/{}/{}".format(
+        key, timestamp.isoformat() if timestamp else "-", edit_generation()
+    )
+    etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    last_modified = max(
+        (t for t in (timestamp, last_edit_time()) if t is not None), default=None
+    )
+
+    if not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = Response(status=304)
+    else:
+        html = cache.get(key)
+        if html is None:
+            html = render()
+            cache.set(key, html, timeout=PAGE_CACHE_TIMEOUT)
+        response = Response(html)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # let browsers keep the page, but have them check it is current
+    response.cache_control.no_cache = True
+    return response
+
+
+def ranked_search(q, term: str, fuzzy: bool = False, limit: int = 15):
+    """Filter a street query by a search term, best matches first.
+
+    Exact prefixes of the name or street id come first, then everything else
+    ordered by trigram similarity to the term. With fuzzy, names that merely
+    look like the term (pg_trgm's % operator) are included as well.
+    """
+    prefix = escape_like(term) + "%"
+    is_prefix = Street.name.ilike(prefix) | Street.street_id.ilike(prefix)
+    matches = Street.name.ilike("%" + prefix) | Street.street_id.ilike(prefix)
+    if fuzzy:
+        matches = matches | Street.name.op("%")(term)
+
+    return (
+        q.filter(matches)
+        .order_by(
+            db.case((is_prefix, 0), else_=1),
+            db.func.similarity(Street.name, term).desc(),
+            Street.name,
+        )
+        .limit(limit)
+        .all()
+    )
+
+
 @blueprint.route("/streets", methods=["GET"])
 def street_search():
     """Search database for streets."""
@@ -72,19 +163,11 @@ def street_search():
         q = db.session.query(Street)
         if form.year.data:
 
-            year = form.year.data
-            first_of_year = datetime.date(month=1, day=1, year=year)
-            q = q.filter(
-                ((Street.start_date < first_of_year) | (Street.start_date.is_(None)))
-                & ((Street.end_date > first_of_year) | (Street.end_date.is_(None)))
-            )
+            q = q.filter(Street.extant_in_year(form.year.data))
         if form.term.data:
-            q = q.filter(
-                (Street.name.ilike("%" + escape_like(form.term.data) + "%"))
-                | (Street.street_id.ilike(escape_like(form.term.data) + "%"))
-            )
-
-        results = streets_sorted(q.limit(15).all())
+            results = ranked_search(q, form.term.data, fuzzy=form.fuzzy.data)
+        else:
+            results = q.order_by(Street.sort_key, Street.id).limit(15).all()
         return jsonify(
             [
                 {
@@ -98,38 +181,43 @@ def street_search():
         )
 
 
-@blueprint.route("/street/", methods=["GET", "POST"])
-def street_listing():
-    """Show all the known streets."""
-    form = StreetSearchForm(request.args)
+def listing_query(form, filtering: bool):
+    """Build the street listing query for a search form, and describe it.
+
+    Without any filtering, the listing is of current streets.
+    """
+    if not (filtering and form.validate()):
+        return (
+            db.session.query(Street).filter(Street.current.is_(True)),
+            "as of today",
+        )
+
     year_str = "as of today"
-    if request.query_string and form.validate():
-        q = db.session.query(Street)
-        if form.year.data:
+    q = db.session.query(Street)
+    if form.year.data:
 
-            year = form.year.data
-            first_of_year = datetime.date(month=1, day=1, year=year)
-            q = q.filter(
-                ((Street.start_date < first_of_year) | (Street.start_date.is_(None)))
-                & ((Street.end_date > first_of_year) | (Street.end_date.is_(None)))
-            )
-            year_str = "as of {}".format(str(year))
+        year = form.year.data
+        q = q.filter(Street.extant_in_year(year))
+        year_str = "as of {}".format(str(year))
 
-        if form.name.data:
-            q = q.filter(Street.name.ilike("%" + escape_like(form.name.data) + "%"))
+    if form.name.data:
+        q = q.filter(Street.name.ilike("%" + escape_like(form.name.data) + "%"))
 
-        if form.confirmed.data is not None:
+    if form.confirmed.data is not None:
 
-            q = q.filter(Street.confirmed == form.confirmed.data)
+        q = q.filter(Street.confirmed == form.confirmed.data)
 
-        # end filters
-        current_streets = streets_sorted(q.all())
-        current_app.logger.info(form.confirmed.data)
+    return q, year_str
+
+
+@blueprint.route("/street/", methods=["GET", "POST"])
+def street_listing():
+    """Show all the known streets."""
+    form = StreetSearchForm(request.args)
+    q, year_str = listing_query(form, bool(request.query_string))
+    current_streets = q.order_by(Street.sort_key, Street.id).all()
+    current_app.logger.info(form.confirmed.data)
 
-    else:
-        current_streets = streets_sorted(
-            db.session.query(Street).filter(Street.current.is_(True)).all()
-        )
     total_count = len(current_streets)
     street_groups = []
     for i in range(0, len(current_streets), 100):
@@ -145,6 +233,63 @@ def street_listing():
     )
 
 
+@blueprint.route("/street/pages/", methods=["GET"])
+def street_pages():
+    """Show the known streets a page at a time, using keyset pagination.
+
+    `after` and `before` are street ids; each page is an index range scan
+    over (sort_key, id) so it costs the same wherever it falls in the list.
+    """
+    form = StreetSearchForm(request.args)
+    cursor_args = {"after", "before", "per_page"}
+    q, year_str = listing_query(form, bool(set(request.args) - cursor_args))
+
+    per_page = request.args.get("per_page", LISTING_PAGE_SIZE, type=int)
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+    position = db.tuple_(Street.sort_key, Street.id)
+
+    if before is not None:
+        anchor = Street.get_by_id(before) or abort(404)
+        q = q.filter(position < db.tuple_(anchor.sort_key, anchor.id)).order_by(
+            Street.sort_key.desc(), Street.id.desc()
+        )
+    else:
+        if after is not None:
+            anchor = Street.get_by_id(after) or abort(404)
+            q = q.filter(position > db.tuple_(anchor.sort_key, anchor.id))
+        q = q.order_by(Street.sort_key, Street.id)
+
+    # one extra row tells us whether there is anything beyond this page
+    streets = q.limit(per_page + 1).all()
+    more = len(streets) > per_page
+    streets = streets[:per_page]
+    if before is not None:
+        streets.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = after is not None, more
+
+    nav_args = {k: v for k, v in request.args.items() if k not in ("after", "before")}
+    prev_url = next_url = None
+    if streets and has_prev:
+        prev_url = url_for("street.street_pages", before=streets[0].id, **nav_args)
+    if streets and has_next:
+        next_url = url_for("street.street_pages", after=streets[-1].id, **nav_args)
+
+    return Response(
+        stream_template(
+            "streets/street_pages.html",
+            streets=streets,
+            search_form=form,
+            year_str=year_str,
+            prev_url=prev_url,
+            next_url=next_url,
+        )
+    )
+
+
 @blueprint.route(
     "/street/missing_start/",
     methods=[
@@ -154,8 +299,11 @@ def street_listing():
 def missing_start():
     """Show all the known streets."""
     form = StreetSearchForm(request.args)
-    current_streets = streets_sorted(
-        db.session.query(Street).filter(Street.start_date.is_(None)).all()
+    current_streets = (
+        db.session.query(Street)
+        .filter(Street.start_date.is_(None))
+        .order_by(Street.sort_key, Street.id)
+        .all()
     )
     total_count = len(current_streets)
 
@@ -181,9 +329,10 @@ def missing_start():
 def missing_end():
     """Show all the known streets that are not current but have no end date."""
     form = StreetSearchForm(request.args)
-    current_streets = streets_sorted(
+    current_streets = (
         db.session.query(Street)
         .filter((Street.end_date.is_(None)) & (Street.current.is_not(True)))
+        .order_by(Street.sort_key, Street.id)
         .all()
     )
     total_count = len(current_streets)
@@ -210,10 +359,15 @@ def view_street(tag: str):
         abort(404)
     except MultipleResultsFound:
         abort(500)
-    return render_template(
-        "streets/street_index.html",
-        street=d,
-        source_notes=markdown.markdown(d.text.replace("\t", "")),
+    return cached_page(
+        "street/{}".format(d.id),
+        d.timestamp,
+        lambda: render_template(
+            "streets/street_index.html",
+            street=d,
+            source_notes=markdown.markdown(d.text.replace("\t", "")),
+            **d.page_context(),
+        ),
     )
 
 
@@ -246,6 +400,39 @@ def add_successor(street, new_successor):
     )
 
 
+def enqueue_street_refresh(street, match_names):
+    """Have the workers bring everything derived from an edited street up to date.
+
+    match_names, from Street.match_names_changed, are the names whose
+    addresses are matched again, if any. Jobs are keyed by street, so a run
+    of edits to one street is caught up on once.
+    """
+    street_id = street.street_id
+    requests = [
+        JobRequest(refresh_stale_geometry, key="all", queue=FAST_QUEUE),
+        JobRequest(
+            refresh_community_area_tags, (street_id,), key=street_id, queue=FAST_QUEUE
+        ),
+        JobRequest(calc_successor_info, (street_id,), key=street_id, queue=FAST_QUEUE),
+        JobRequest(inherit_grid, (street_id,), key=street_id, queue=FAST_QUEUE),
+        JobRequest(
+            redraw_map_for_street, (street_id,), key=street_id, queue=MAPS_QUEUE
+        ),
+        # only hands out a job per tag map, on the maps queue
+        JobRequest(redraw_affected_tags, (street_id,), key=street_id, queue=FAST_QUEUE),
+    ]
+    if match_names:
+        # by name, as the directory tasks import the street models
+        requests.append(
+            JobRequest(
+                "chicagodir.directory.tasks.rematch_street_addresses",
+                (street.id, match_names),
+                key="{}/{}".format(street.id, ",".join(match_names)),
+            )
+        )
+    dispatch(requests)
+
+
 @blueprint.route("/street/<string:tag>/edit", methods=["GET", "POST"])
 @login_required
 def edit_street(tag: str):
@@ -265,17 +452,20 @@ def edit_street(tag: str):
 
     # set up street choices
     street_choices = [
-        (street.id, street.full_name)
-        for street in streets_sorted(d.contemporary_streets())
+        (street.id, street.full_name) for street in d.contemporary_streets()
     ]
     form.set_street_choices(street_choices)
 
     if form.validate_on_submit():
         form.populate_obj(d)
+        # taken before anything commits, which forgets what was changed
+        changes = d.pending_changes()
 
         # remove successor streets marked for deletion
+        successors_changed = False
         for to_remove in [x for x in d.successors if x.remove]:
             remove_successor(d, to_remove)
+            successors_changed = True
 
         #  check for new successor street
         if form.new_successor_street.data is not None:
@@ -287,19 +477,17 @@ def edit_street(tag: str):
             )
             new_successor.save()
             add_successor(d, new_successor)
+            successors_changed = True
 
-        d.record_changes(current_user)
-
-        d.save()
-
-        with Connection(redis.from_url(current_app.config["REDIS_URL"])):
-            q = Queue()
-            q.enqueue(refresh_community_area_tags, d.street_id)
-            q.enqueue(redraw_map_for_street, d.street_id)
-            q.enqueue(calc_successor_info, d.street_id)
-            q.enqueue(inherit_grid, d.street_id)
-            q.enqueue(redraw_affected_tags, d.street_id)
+        d.record_changes(current_user, changes)
+        match_names = d.match_names_changed(changes)
+        d.save(changes=changes)
+        if successors_changed:
+            StreetLineage.refresh(d.id)
+            Street.invalidate_derived_geometry(d.id)
+            db.session.commit()
 
+        enqueue_street_refresh(d, match_names)
         return redirect(url_for("street.view_street", tag=tag))
     elif form.is_submitted():
         current_app.logger.warning("submitted but invalid")
@@ -316,9 +504,13 @@ def view_streetlist(streetlist_id: int):
     except MultipleResultsFound:
         abort(500)
 
-    return render_template(
-        "streets/streetlist_view.html",
-        streetlist=sl,
+    return cached_page(
+        "streetlist/{}".format(sl.id),
+        None,
+        lambda: render_template(
+            "streets/streetlist_view.html",
+            streetlist=sl,
+        ),
     )
 
 
@@ -383,11 +575,19 @@ def edit_streetlist(streetlist_id: int):
 
             new_entry.save()
         street_list.save()
+        bump_edit_generation()
         form = StreetListForm(request.form, obj=street_list)
 
-        with Connection(redis.from_url(current_app.config["REDIS_URL"])):
-            q = Queue()
-            q.enqueue(redraw_map_for_streetlist, street_list.id)
+        dispatch(
+            [
+                JobRequest(
+                    redraw_map_for_streetlist,
+                    (street_list.id,),
+                    key=street_list.id,
+                    queue=MAPS_QUEUE,
+                )
+            ]
+        )
 
     return render_template(
         "streets/streetlist_edit.html", streetlist=street_list, street_list_form=form
@@ -409,6 +609,7 @@ def remove_street_from_streetlist(streetlist_id: int, entry_id: int):
 
     if entry is not None:
         entry.delete()
+        bump_edit_generation()
     return redirect(url_for("street.edit_streetlist", streetlist_id=streetlist_id))
 
 
@@ -426,15 +627,7 @@ def list_streetlists():
 @blueprint.route("/streets/tags/", methods=["GET"])
 def list_tags():
     """Show all the known tags."""
-    streets_with_tags = (
-        db.session.query(Street).filter(Street.tags != None).all()  # noqa
-    )
-
-    all_tags = set()
-    for street in streets_with_tags:
-        all_tags.update(set(street.tags))
-
-    all_tags = sorted(list((all_tags)))
+    all_tags = StreetTag.query.order_by(StreetTag.tag).all()
     return render_template(
         "streets/tags_list.html",
         all_tags=all_tags,
@@ -444,40 +637,80 @@ def list_tags():
 @blueprint.route("/streets/tags/<string:tag>/", methods=["GET", "POST"])
 def view_tag(tag: str):
     """Viewing a tag."""
-    streets = db.session.query(Street).filter(Street.tags.contains([tag])).all()
+    streets = (
+        db.session.query(Street)
+        .filter(Street.tags.contains([tag]))
+        .order_by(Street.sort_key, Street.id)
+        .all()
+    )
     if not streets:
         abort(404)
 
-    return render_template(
-        "streets/tag_view.html",
-        tag=tag,
-        streetlist=streets_sorted(streets),
+    timestamp = (
+        db.session.query(db.func.max(StreetEdit.timestamp))
+        .filter(StreetEdit.street_id.in_([street.id for street in streets]))
+        .scalar()
+    )
+    return cached_page(
+        "tag/{}".format(tag),
+        timestamp,
+        lambda: render_template(
+            "streets/tag_view.html",
+            tag=tag,
+            streetlist=streets,
+        ),
     )
 
 
 @blueprint.route("/streets/tags/<string:tag>/edit", methods=["GET", "POST"])
 def edit_tag(tag: str):
     """Editing a tag."""
-    streets = db.session.query(Street).filter(Street.tags.contains([tag])).all()
+    streets = (
+        db.session.query(Street)
+        .filter(Street.tags.contains([tag]))
+        .order_by(Street.sort_key, Street.id)
+        .all()
+    )
     if not streets:
         abort(404)
 
     return render_template(
         "streets/tag_view.html",
         tag=tag,
-        streetlist=streets_sorted(streets),
+        streetlist=streets,
     )
 
 
 @blueprint.route("/streets/export", methods=["GET"])
 def export_streets_csv():
     """Dump csv."""
-    sql = """COPY streets to STDIN WITH (FORMAT csv, DELIMITER ',', QUOTE '"', HEADER TRUE)"""
-    file = io.StringIO()
-    connection = db.get_engine().raw_connection()
-    cur = connection.cursor()
-    cur.copy_expert(sql, file)
-    output = make_response(file.getvalue())
-    output.headers["Content-type"] = "text/csv"
-    output.headers["Content-Disposition"] = "attachment; filename=export.csv"
-    return output
+    return export_streets("csv")
+
+
+@blueprint.route("/streets/export.<string:fmt>", methods=["GET"])
+def export_streets(fmt: str):
+    """Stream the streets table as CSV, GeoJSON lines or GeoParquet.
+
+    CSV and GeoJSON lines may be gzipped on the fly with ?gzip=1.
+    """
+    exporters = {
+        "csv": (csv_chunks, "text/csv"),
+        "geojsonl": (geojsonl_chunks, "application/geo+json-seq"),
+        "parquet": (geoparquet_chunks, "application/vnd.apache.parquet"),
+    }
+    if fmt not in exporters:
+        abort(404)
+    exporter, mimetype = exporters[fmt]
+
+    chunks = exporter(db.engine)
+    filename = "export.{}".format(fmt)
+    if fmt != "parquet" and request.args.get("gzip", type=int):
+        chunks = gzip_chunks(chunks)
+        mimetype = "application/gzip"
+        filename += ".gz"
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": "attachment; filename={}".format(filename)},
+    )
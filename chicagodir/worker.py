@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""The RQ worker that runs the app's background tasks."""
+from rq import Worker
+
+from chicagodir.database import db
+from chicagodir.streets.geodata import warm_geodata
+
+
+class GeodataWorker(Worker):
+    """A worker that keeps the map geodata loaded across jobs.
+
+    RQ runs each job in a fork of the worker, so anything a job loads is
+    lost when it finishes. Loading the geodata in the worker itself, before
+    each fork, lets every job inherit it instead.
+    """
+
+    def execute_job(self, job, queue):
+        """Bring the geodata cache up to date, then run the job in a fork."""
+        warm_geodata()
+        # the fork must not share the worker's database connections
+        db.engine.dispose()
+        return super().execute_job(job, queue)
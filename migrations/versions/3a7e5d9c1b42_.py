@@ -0,0 +1,133 @@
+"""normalised street keys on directory addresses
+
+Revision ID: 3a7e5d9c1b42
+Revises: f16c0b8e4d27
+Create Date: 2026-10-17 18:05:37.264190
+
+"""
+import re
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3a7e5d9c1b42"
+down_revision = "f16c0b8e4d27"
+branch_labels = None
+depends_on = None
+
+# chicagodir.streets.matching.street_key and the name fixes it relies on, as
+# they stood for this revision; a copy, so the backfill stays as it was
+STREET_TYPES = {
+    "AY": "AVE",
+    "AV": "AVE",
+    "AVENUE": "AVE",
+    "DRIVE": "DR",
+    "PLACE": "PL",
+    "COURT": "CT",
+    "TERRACE": "TER",
+    "TERR": "TER",
+    "ROAD": "RD",
+    "PARKWAY": "PKWY",
+    "SQUARE": "SQ",
+    "STREET": "ST",
+    "EXPRESSWAY": "EXPY",
+    "BOULEVARD": "BLVD",
+    "CRESCENT": "CRES",
+    "LANE": "LN",
+    "PLAZA": "PLZ",
+    "HIGHWAY": "HWY",
+}
+
+
+def fix_street_name(name):
+    name = name.upper()
+    m = re.match(r"(\d+)([^\d\s]+)", name)
+    if not m:
+        return name
+    number = m.group(1)
+    if 3 < int(number) < 20:
+        return number + "TH"
+    return number + {"3": "RD", "2": "ND", "1": "ST"}.get(number[-1], "TH")
+
+
+def fix_street_type(suffix):
+    suffix = suffix.strip(".,").upper().strip()
+    return STREET_TYPES.get(suffix, suffix)
+
+
+def street_key(name, suffix, direction):
+    return (
+        fix_street_name(name) if name else None,
+        fix_street_type(suffix) if suffix else None,
+        (direction or "").strip(".").upper().strip() or None,
+    )
+
+
+SPELLINGS_SQL = """
+SELECT DISTINCT COALESCE(street_name, ''), COALESCE(street_name_post_type, ''),
+    COALESCE(street_name_pre_directional, '')
+FROM d_address
+"""
+
+BACKFILL_SQL = """
+UPDATE d_address SET match_name = keys.match_name,
+    match_suffix = keys.match_suffix,
+    match_direction = keys.match_direction
+FROM unnest(CAST(:names AS text[]), CAST(:suffixes AS text[]),
+            CAST(:directions AS text[]), CAST(:match_names AS text[]),
+            CAST(:match_suffixes AS text[]), CAST(:match_directions AS text[]))
+    AS keys(name, suffix, direction, match_name, match_suffix, match_direction)
+WHERE COALESCE(d_address.street_name, '') = keys.name
+    AND COALESCE(d_address.street_name_post_type, '') = keys.suffix
+    AND COALESCE(d_address.street_name_pre_directional, '') = keys.direction
+"""
+
+
+def upgrade():
+    op.add_column("d_address", sa.Column("match_name", sa.String(), nullable=True))
+    op.add_column("d_address", sa.Column("match_suffix", sa.String(), nullable=True))
+    op.add_column("d_address", sa.Column("match_direction", sa.String(), nullable=True))
+    op.create_index(
+        "idx_d_address_match_key",
+        "d_address",
+        ["match_name", "match_suffix", "match_direction"],
+        unique=False,
+    )
+    op.create_index(
+        "idx_d_address_match_name_trgm",
+        "d_address",
+        ["match_name"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"match_name": "gin_trgm_ops"},
+    )
+
+    # backfill using the same rules as loading; the keys are normalised in
+    # Python, once for each way a street is written, blanks being alike
+    connection = op.get_bind()
+    spellings = [
+        (spelling, street_key(*spelling))
+        for spelling in connection.execute(sa.text(SPELLINGS_SQL))
+    ]
+    spellings = [(spelling, key) for spelling, key in spellings if any(key)]
+    if spellings:
+        connection.execute(
+            sa.text(BACKFILL_SQL),
+            {
+                "names": [spelling[0] for spelling, _ in spellings],
+                "suffixes": [spelling[1] for spelling, _ in spellings],
+                "directions": [spelling[2] for spelling, _ in spellings],
+                "match_names": [key[0] for _, key in spellings],
+                "match_suffixes": [key[1] for _, key in spellings],
+                "match_directions": [key[2] for _, key in spellings],
+            },
+        )
+
+
+def downgrade():
+    op.drop_index("idx_d_address_match_name_trgm", table_name="d_address")
+    op.drop_index("idx_d_address_match_key", table_name="d_address")
+    op.drop_column("d_address", "match_direction")
+    op.drop_column("d_address", "match_suffix")
+    op.drop_column("d_address", "match_name")
@@ -0,0 +1,26 @@
+"""composite sort index for keyset pagination
+
+Revision ID: 5e1a93b7d0c4
+Revises: c47d0e8f2b19
+Create Date: 2026-10-17 12:10:52.447391
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5e1a93b7d0c4"
+down_revision = "c47d0e8f2b19"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "idx_streets_sort_key_id", "streets", ["sort_key", "id"], unique=False
+    )
+    op.drop_index("ix_streets_sort_key", table_name="streets")
+
+
+def downgrade():
+    op.create_index("ix_streets_sort_key", "streets", ["sort_key"], unique=False)
+    op.drop_index("idx_streets_sort_key_id", table_name="streets")
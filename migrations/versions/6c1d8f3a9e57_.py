@@ -0,0 +1,95 @@
+"""per-directory profession counts
+
+Revision ID: 6c1d8f3a9e57
+Revises: 3a7e5d9c1b42
+Create Date: 2026-10-17 18:41:12.530846
+
+"""
+import re
+from collections import Counter
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6c1d8f3a9e57"
+down_revision = "3a7e5d9c1b42"
+branch_labels = None
+depends_on = None
+
+# how chicagodir.directory.models.profession_key normalised professions at
+# this revision, copied here so the counts backfilled never drift from it
+PROFESSION_ABBREVIATIONS = {
+    "AGT": "AGENT",
+    "BKKPR": "BOOKKEEPER",
+    "CARP": "CARPENTER",
+    "CLK": "CLERK",
+    "DRESSMKR": "DRESSMAKER",
+    "ENGR": "ENGINEER",
+    "LAB": "LABORER",
+    "MACH": "MACHINIST",
+    "MGR": "MANAGER",
+    "MER": "MERCHANT",
+    "PHYS": "PHYSICIAN",
+    "PTR": "PAINTER",
+    "SALESMN": "SALESMAN",
+    "STENOG": "STENOGRAPHER",
+    "TCHR": "TEACHER",
+    "TMSTR": "TEAMSTER",
+    "TRAV": "TRAVELER",
+}
+
+
+def profession_key(profession):
+    words = re.sub(r"[^\w\s]", " ", profession or "").upper().split()
+    return " ".join(PROFESSION_ABBREVIATIONS.get(w, w) for w in words) or None
+
+
+PROFESSIONS_SQL = """
+SELECT pages.directory_id, entries.profession, count(*)
+FROM entries JOIN pages ON pages.id = entries.page_id
+GROUP BY pages.directory_id, entries.profession
+"""
+
+
+def upgrade():
+    op.create_table(
+        "profession_counts",
+        sa.Column("directory_id", sa.Integer(), nullable=False),
+        sa.Column("profession", sa.String(), nullable=False),
+        sa.Column("entry_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["directory_id"],
+            ["directories.id"],
+        ),
+        sa.PrimaryKeyConstraint("directory_id", "profession"),
+    )
+
+    # backfill using the same rules as loading; professions are counted as
+    # written in SQL, then normalised in Python and counted together
+    connection = op.get_bind()
+    counts = Counter()
+    for directory_id, profession, entry_count in connection.execute(
+        sa.text(PROFESSIONS_SQL)
+    ):
+        key = profession_key(profession)
+        if key is not None:
+            counts[directory_id, key] += entry_count
+    if counts:
+        profession_counts = sa.table(
+            "profession_counts",
+            sa.column("directory_id", sa.Integer),
+            sa.column("profession", sa.String),
+            sa.column("entry_count", sa.Integer),
+        )
+        connection.execute(
+            profession_counts.insert(),
+            [
+                {"directory_id": directory_id, "profession": key, "entry_count": n}
+                for (directory_id, key), n in counts.items()
+            ],
+        )
+
+
+def downgrade():
+    op.drop_table("profession_counts")
@@ -0,0 +1,53 @@
+"""street lineage closure table
+
+Revision ID: 7fa2d5c83e06
+Revises: e83f6a2c91d5
+Create Date: 2026-10-17 14:31:45.280937
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7fa2d5c83e06"
+down_revision = "e83f6a2c91d5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "street_lineage",
+        sa.Column("ancestor_id", sa.Integer(), nullable=False),
+        sa.Column("descendant_id", sa.Integer(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["ancestor_id"], ["streets.id"]),
+        sa.ForeignKeyConstraint(["descendant_id"], ["streets.id"]),
+        sa.PrimaryKeyConstraint("ancestor_id", "descendant_id"),
+    )
+    op.create_index(
+        op.f("ix_street_lineage_descendant_id"),
+        "street_lineage",
+        ["descendant_id"],
+        unique=False,
+    )
+    op.execute(
+        """
+        WITH RECURSIVE walk(ancestor_id, descendant_id, depth) AS (
+                SELECT from_id, to_id, 1 FROM streetchange WHERE to_id IS NOT NULL
+            UNION
+                SELECT walk.ancestor_id, streetchange.to_id, walk.depth + 1
+                FROM walk JOIN streetchange ON streetchange.from_id = walk.descendant_id
+                WHERE streetchange.to_id IS NOT NULL AND walk.depth < 50
+        )
+        INSERT INTO street_lineage (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, min(depth) FROM walk
+        WHERE ancestor_id <> descendant_id
+        GROUP BY ancestor_id, descendant_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_street_lineage_descendant_id"), table_name="street_lineage")
+    op.drop_table("street_lineage")
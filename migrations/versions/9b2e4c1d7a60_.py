@@ -0,0 +1,39 @@
+"""trigram indexes for street search
+
+Revision ID: 9b2e4c1d7a60
+Revises: 3154e83d2e30
+Create Date: 2026-10-17 10:02:11.318204
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9b2e4c1d7a60"
+down_revision = "3154e83d2e30"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "idx_streets_name_trgm",
+        "streets",
+        ["name"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "idx_streets_street_id_trgm",
+        "streets",
+        ["street_id"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"street_id": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.drop_index("idx_streets_street_id_trgm", table_name="streets")
+    op.drop_index("idx_streets_name_trgm", table_name="streets")
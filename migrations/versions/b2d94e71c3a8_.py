@@ -0,0 +1,58 @@
+"""derived street geometry with its provenance
+
+Revision ID: b2d94e71c3a8
+Revises: 7fa2d5c83e06
+Create Date: 2026-10-17 15:42:19.520931
+
+"""
+import geoalchemy2
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b2d94e71c3a8"
+down_revision = "7fa2d5c83e06"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "streets",
+        sa.Column(
+            "derived_geom",
+            geoalchemy2.types.Geometry(
+                srid=3435, from_text="ST_GeomFromEWKT", name="geometry"
+            ),
+            nullable=True,
+        ),
+    )
+    op.add_column(
+        "streets", sa.Column("derived_geom_source", sa.String(length=8), nullable=True)
+    )
+    op.create_index(
+        "idx_streets_derived_geom",
+        "streets",
+        ["derived_geom"],
+        unique=False,
+        postgresql_using="gist",
+    )
+    op.create_index(
+        op.f("ix_streets_derived_geom_source"),
+        "streets",
+        ["derived_geom_source"],
+        unique=False,
+    )
+    # streets with their own geometry need nothing worked out; the rest are
+    # left NULL, to be filled in by `flask refresh_geometry`
+    op.execute(
+        """UPDATE streets SET derived_geom = geom, derived_geom_source = 'stored'
+           WHERE geom IS NOT NULL"""
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_streets_derived_geom_source"), table_name="streets")
+    op.drop_index("idx_streets_derived_geom", table_name="streets")
+    op.drop_column("streets", "derived_geom_source")
+    op.drop_column("streets", "derived_geom")
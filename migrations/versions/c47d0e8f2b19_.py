@@ -0,0 +1,68 @@
+"""stored natural sort key for streets
+
+Revision ID: c47d0e8f2b19
+Revises: 9b2e4c1d7a60
+Create Date: 2026-10-17 11:24:37.902114
+
+"""
+import re
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c47d0e8f2b19"
+down_revision = "9b2e4c1d7a60"
+branch_labels = None
+depends_on = None
+
+# the sort key rules of chicagodir.streets.sorting when this revision was
+# written, copied so that later changes there leave this backfill alone
+SORT_KEY_DIGITS = 10
+
+
+def street_sort_string(street):
+    text = (
+        street.name + " " + str(street.suffix or "") + " " + str(street.direction or "")
+    )
+    return "".join(
+        str(int(part)).zfill(SORT_KEY_DIGITS) if part.isdigit() else part + "\x01"
+        for part in re.split(r"(\d+)", text)
+    )
+
+
+def upgrade():
+    op.add_column(
+        "streets",
+        sa.Column("sort_key", sa.String(length=255, collation="C"), nullable=True),
+    )
+    op.create_index(op.f("ix_streets_sort_key"), "streets", ["sort_key"], unique=False)
+
+    # backfill using the same rules the application uses on save
+    streets = sa.table(
+        "streets",
+        sa.column("id", sa.Integer),
+        sa.column("name", sa.String),
+        sa.column("suffix", sa.String),
+        sa.column("direction", sa.String),
+        sa.column("sort_key", sa.String),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(streets.c.id, streets.c.name, streets.c.suffix, streets.c.direction)
+    ).fetchall()
+    if rows:
+        connection.execute(
+            streets.update()
+            .where(streets.c.id == sa.bindparam("street_pk"))
+            .values(sort_key=sa.bindparam("new_sort_key")),
+            [
+                {"street_pk": row.id, "new_sort_key": street_sort_string(row)}
+                for row in rows
+            ],
+        )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_streets_sort_key"), table_name="streets")
+    op.drop_column("streets", "sort_key")
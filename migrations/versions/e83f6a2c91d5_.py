@@ -0,0 +1,46 @@
+"""street lifetime daterange with gist index
+
+Revision ID: e83f6a2c91d5
+Revises: 5e1a93b7d0c4
+Create Date: 2026-10-17 12:58:03.114562
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "e83f6a2c91d5"
+down_revision = "5e1a93b7d0c4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "streets",
+        sa.Column(
+            "lifetime",
+            postgresql.DATERANGE(),
+            # daterange() raises on dates the wrong way round, which some
+            # streets have; they get an empty range, and exist in no year
+            sa.Computed(
+                "CASE WHEN start_date > end_date THEN 'empty'::daterange "
+                "ELSE daterange(start_date, end_date, '[]') END",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        "idx_streets_lifetime",
+        "streets",
+        ["lifetime"],
+        unique=False,
+        postgresql_using="gist",
+    )
+
+
+def downgrade():
+    op.drop_index("idx_streets_lifetime", table_name="streets")
+    op.drop_column("streets", "lifetime")
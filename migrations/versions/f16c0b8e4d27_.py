@@ -0,0 +1,41 @@
+"""gin index on street tags and a table of tag counts
+
+Revision ID: f16c0b8e4d27
+Revises: b2d94e71c3a8
+Create Date: 2026-10-17 16:20:44.108312
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f16c0b8e4d27"
+down_revision = "b2d94e71c3a8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "idx_streets_tags",
+        "streets",
+        ["tags"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.create_table(
+        "street_tags",
+        sa.Column("tag", sa.String(), nullable=False),
+        sa.Column("street_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("tag"),
+    )
+    op.execute(
+        """INSERT INTO street_tags (tag, street_count)
+           SELECT tag, count(DISTINCT id) FROM streets, unnest(tags) AS tag
+           GROUP BY tag"""
+    )
+
+
+def downgrade():
+    op.drop_table("street_tags")
+    op.drop_index("idx_streets_tags", table_name="streets")
@@ -36,6 +36,9 @@ def db(app):
     """Create database for the tests."""
     _db.app = app
     with app.app_context():
+        # the trigram indexes on streets need the extension, as in migrations
+        with _db.engine.begin() as connection:
+            connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
         _db.create_all()
 
     yield _db
@@ -28,3 +28,31 @@ class UserFactory(BaseFactory):
         """Factory configuration."""
 
         model = User
+
+
+def directory_row(page, last_name, home=None, work=None, profession=None) -> dict:
+    """A row of an OCR'd directory page, as read from its CSV.
+
+    home and work are street names, with no number, direction or suffix.
+    """
+    row = {
+        "page": str(page),
+        "FirstName": "John",
+        "LastName": last_name,
+        "MiddleName": "",
+        "Profession": profession or "",
+        "Widow": "",
+        "HomeAddressPlaceName": "",
+    }
+    for kind, street_name in (("Home", home), ("Work", work)):
+        for column in (
+            "AddressNumber",
+            "AddressStreetNamePreDirectional",
+            "AddressStreetNamePostType",
+            "AddressSubaddressType",
+            "AddressSubaddressIdentifier",
+            "AddressBuildingName",
+        ):
+            row[kind + column] = ""
+        row[kind + "AddressStreetName"] = street_name or ""
+    return row
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Street export unit tests."""
+import gzip
+
+from chicagodir.streets.export import EXPORT_COLUMNS, csv_chunks, csv_field, gzip_chunks
+
+
+class FakeCursor:
+    """Named cursor handing out rows in batches."""
+
+    def __init__(self, rows):
+        """Set up."""
+        self.rows = list(rows)
+
+    def execute(self, sql):
+        """Pretend to run the query."""
+        self.sql = sql
+
+    def fetchmany(self, size):
+        """Take the next batch of rows."""
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+class FakeEngine:
+    """Engine handing out connections to a fake cursor."""
+
+    def __init__(self, cursor):
+        """Set up."""
+        self.cursor = cursor
+        self.closed = False
+
+    def raw_connection(self):
+        """Return a connection-like object."""
+        engine = self
+
+        class Connection:
+            def cursor(self, name=None):
+                return engine.cursor
+
+            def close(self):
+                engine.closed = True
+
+        return Connection()
+
+
+class TestExport:
+    """Streaming exports."""
+
+    def test_csv_fields(self):
+        """Fields are quoted as COPY quotes them."""
+        assert csv_field(None) == ""
+        assert csv_field("") == '""'
+        assert csv_field("STATE") == "STATE"
+        assert csv_field("{ALLEY,PARK}") == '"{ALLEY,PARK}"'
+        assert csv_field('the "old" name') == '"the ""old"" name"'
+        assert csv_field("line\nbreak") == '"line\nbreak"'
+
+    def test_csv_streams_every_batch(self):
+        """Every row comes out after the header, and the connection is closed."""
+        row = (None,) * (len(EXPORT_COLUMNS) - 1)
+        engine = FakeEngine(FakeCursor(("%d" % i,) + row for i in range(5)))
+        chunks = list(csv_chunks(engine, batch_size=2))
+        assert len(chunks) == 4
+        assert "".join(chunks).splitlines() == [",".join(EXPORT_COLUMNS)] + [
+            "%d" % i + "," * len(row) for i in range(5)
+        ]
+        assert engine.closed
+
+    def test_gzip(self):
+        """Gzipped output decompresses to the original."""
+        data = b"".join(gzip_chunks(["a,b\n", b"1,2\n"]))
+        assert gzip.decompress(data) == b"a,b\n1,2\n"
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 """Test forms."""
+from werkzeug.datastructures import MultiDict
 
 from chicagodir.public.forms import LoginForm
+from chicagodir.streets.forms import StreetEditForm
 from chicagodir.user.forms import RegisterForm
 
 
@@ -72,3 +74,18 @@ class TestLoginForm:
         form = LoginForm(username=user.username, password="myprecious")
         assert form.validate() is False
         assert "User not activated" in form.username.errors
+
+
+class TestStreetEditForm:
+    """Street edit form."""
+
+    def test_end_date_before_start_date(self, app):
+        """A street cannot end before it starts."""
+        form = StreetEditForm(
+            MultiDict(
+                {"name": "FOSTER", "start_date": "1900-01-01", "end_date": "1890-01-01"}
+            )
+        )
+        form.set_street_choices([])
+        assert form.validate() is False
+        assert "End date must not be before the start date" in form.end_date.errors
@@ -4,7 +4,20 @@
 See: http://webtest.readthedocs.org/
 """
 from flask import url_for
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry import LineString
+from sqlalchemy import event
 
+from chicagodir.database import db
+from chicagodir.streets import views
+from chicagodir.streets.models import (
+    GEOMETRY_CLIPPED,
+    GEOMETRY_UNION,
+    Street,
+    StreetChange,
+    StreetEdit,
+    StreetTag,
+)
 from chicagodir.user.models import User
 
 from .factories import UserFactory
@@ -118,3 +131,143 @@ class TestRegistering:
         res = form.submit()
         # sees error
         assert "Username already registered" in res
+
+
+class TestStreetPage:
+    """The page for a single street."""
+
+    # looking up the street, its successors, predecessors, geometry (up to
+    # three), lists, similar and aligned streets, and edit history
+    QUERY_BUDGET = 10
+
+    def test_street_page_within_query_budget(self, user, testapp):
+        """The street page runs a fixed number of statements, however many relations."""
+        street = Street(
+            street_id="FOSTER_00",
+            name="FOSTER",
+            suffix="AVE",
+            grid_location=5200,
+            grid_direction="N",
+            current=True,
+            text="",
+        )
+        street.save()
+        for i in range(3):
+            old = Street(street_id=f"OLD_{i:02}", name=f"OLD {i}", suffix="ST", text="")
+            old.save()
+            StreetChange(from_id=old.id, to_id=street.id).save()
+            StreetEdit(street=street, user=user, note=f"edit {i}").save()
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = Street.query.session.get_bind()
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            res = testapp.get(url_for("street.view_street", tag="FOSTER_00"))
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert res.status_code == 200
+        assert "Old 1 St" in res
+        assert len(statements) <= self.QUERY_BUDGET
+
+
+class TestEditingStreet:
+    """Saving the street edit form, and what it sets off."""
+
+    def edit(self, testapp, user, street, monkeypatch, **fields):
+        """Log in, submit the edit form with the fields changed, and return the jobs."""
+        res = testapp.get("/")
+        form = res.forms["loginForm"]
+        form["username"] = user.username
+        form["password"] = "myprecious"
+        form.submit().follow()
+
+        dispatched = []
+        monkeypatch.setattr(
+            views,
+            "dispatch",
+            lambda requests, debounce=None: dispatched.extend(requests),
+        )
+        form = testapp.get(url_for("street.edit_street", tag=street.street_id)).form
+        for field, value in fields.items():
+            form[field] = value
+        res = form.submit()
+        assert res.status_code == 302
+        return dispatched
+
+    @staticmethod
+    def geometry_source(street):
+        """Where the stored derived geometry of a street came from, as saved."""
+        return (
+            db.session.query(Street.derived_geom_source)
+            .filter(Street.id == street.id)
+            .scalar()
+        )
+
+    def test_renaming_rematches_addresses(self, user, testapp, monkeypatch):
+        """A new name has the addresses under the old and new names matched again."""
+        street = Street(street_id="FOSTER_00", name="FOSTER", suffix="AVE", text="")
+        street.save()
+
+        dispatched = self.edit(testapp, user, street, monkeypatch, name="FOSTERS")
+
+        rematches = [
+            request
+            for request in dispatched
+            if request.func == "chicagodir.directory.tasks.rematch_street_addresses"
+        ]
+        assert [request.args for request in rematches] == [
+            (street.id, ["FOSTER", "FOSTERS"])
+        ]
+
+    def test_address_range_refreshes_geometry(self, user, testapp, monkeypatch):
+        """Giving an address range has the derived geometry clipped to it."""
+        current = Street(
+            street_id="CLARK_00",
+            name="CLARK",
+            suffix="ST",
+            direction="N",
+            current=True,
+            text="",
+            geom=from_shape(
+                LineString([(1170000, 1900205), (1170000, 1965816)]), srid=3435
+            ),
+        )
+        current.save()
+        old = Street(street_id="OLD_00", name="OLD", suffix="ST", text="")
+        old.save()
+        StreetChange(from_id=old.id, to_id=current.id).save()
+        Street.refresh_stale_geometry()
+        assert self.geometry_source(old) == GEOMETRY_UNION
+
+        self.edit(
+            testapp, user, old, monkeypatch, min_address="1000", max_address="2000"
+        )
+
+        assert self.geometry_source(old) is None
+        Street.refresh_stale_geometry()
+        old = Street.get_by_id(old.id)
+        assert old.derived_geom_source == GEOMETRY_CLIPPED
+        _, y_min, _, y_max = to_shape(old.derived_geom).bounds
+        assert (round(y_min), round(y_max)) == (1906766, 1913327)
+
+    def test_tag_edit_recounts_tags(self, user, testapp, monkeypatch):
+        """Tags added and removed in the form are recounted."""
+        street = Street(
+            street_id="FOSTER_00",
+            name="FOSTER",
+            suffix="AVE",
+            text="",
+            tags=["boulevard"],
+        )
+        street.save()
+
+        self.edit(testapp, user, street, monkeypatch, tags="CA3-Uptown")
+
+        assert {tag.tag: tag.street_count for tag in StreetTag.query} == {
+            "CA3-Uptown": 1
+        }
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Whole-graph grid inheritance unit tests."""
+from chicagodir.streets.grid_inheritance import (
+    GridInfo,
+    current_successors,
+    inherit_grid_info,
+    inherited,
+    reverse_topological_components,
+)
+
+BLANK = GridInfo(False, False, None, None)
+
+
+class TestGridInheritance:
+    """Inheriting grid positions across the street change graph."""
+
+    def test_successors_come_first(self):
+        """Every component comes after the components it leads to."""
+        edges = {1: {2}, 2: {3}, 3: {2, 4}}
+        assert reverse_topological_components([1, 2, 3, 4], edges) == [
+            [4],
+            [2, 3],
+            [1],
+        ]
+
+    def test_chain_inherits_from_current_street(self):
+        """Every street along a chain takes the position of the current street."""
+        info = {
+            1: BLANK,
+            2: BLANK,
+            3: GridInfo(True, False, "N", 5200),
+        }
+        changed = inherit_grid_info(info, {1: {2}, 2: {3}})
+        assert changed == {
+            1: GridInfo(False, False, "N", 5200),
+            2: GridInfo(False, False, "N", 5200),
+        }
+
+    def test_disagreeing_successors(self):
+        """Only what all current successors agree on is inherited."""
+        info = {
+            1: BLANK,
+            2: GridInfo(True, False, "N", 5200),
+            3: GridInfo(True, True, "N", 5600),
+            4: GridInfo(False, False, "S", 100),
+        }
+        changed = inherit_grid_info(info, {1: {2, 3}, 4: {2}})
+        assert changed == {1: GridInfo(False, True, "N", None)}
+
+    def test_current_street_also_reached_around_another(self):
+        """A current street reached both through and around another is kept."""
+        info = {
+            1: BLANK,
+            2: BLANK,
+            3: GridInfo(True, False, "N", 5200),
+            4: GridInfo(True, False, "N", 5600),
+            5: GridInfo(True, False, "S", 100),
+        }
+        edges = {1: {2, 3}, 2: {4}, 3: {4, 5}}
+        assert current_successors(1, info, edges) == {3, 4}
+        changed = inherit_grid_info(info, edges)
+        assert changed[1] == inherited(info[1], [info[3], info[4]])
+        assert changed[1] == GridInfo(False, False, "N", None)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Directory page ingest tests."""
+import io
+import zipfile
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from chicagodir.directory.ingest import (
+    IngestReport,
+    address_values,
+    blank_to_none,
+    ingest_page,
+)
+from chicagodir.directory.models import Address, Directory, Entry, Page
+from chicagodir.directory.views import uploaded_pages
+from chicagodir.streets.models import Street
+
+from .factories import directory_row
+
+
+class TestIngest:
+    """Checking and normalising uploaded rows."""
+
+    def test_missing_columns_rejects_file(self, app):
+        """A file without the expected columns is reported and not loaded."""
+        report = ingest_page(Directory(year=1911), [{"page": "4", "LastName": "Smith"}])
+        assert report.entries == 0
+        assert report.errors[0][0] == 1
+        assert "FirstName" in report.errors[0][1]
+
+    def test_bad_address_number_is_a_warning(self, app):
+        """An unreadable address number is dropped, with a warning."""
+        row = blank_to_none(
+            {
+                "HomeAddressNumber": "12x",
+                "HomeAddressStreetNamePreDirectional": "N",
+                "HomeAddressStreetName": "Foster",
+                "HomeAddressStreetNamePostType": "Av",
+                "HomeAddressSubaddressType": "",
+                "HomeAddressSubaddressIdentifier": "",
+                "HomeAddressBuildingName": "",
+                "HomeAddressPlaceName": "",
+            }
+        )
+        report = IngestReport()
+        address = address_values(row, "home", 5, report)
+        assert address["number"] is None
+        assert address["street_name"] == "Foster"
+        assert address["subaddress_type"] is None
+        assert report.warnings == [(5, "home address number '12x' is not a number")]
+
+    def test_zip_upload_fans_out_by_page(self):
+        """Every CSV in an uploaded zip is a page of its own."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("lakeside/p2.csv", "page\n2\n")
+            archive.writestr("lakeside/p1.csv", "page\n1\n")
+            archive.writestr("lakeside/notes.txt", "not a page")
+        buffer.seek(0)
+        pages = uploaded_pages(FileStorage(stream=buffer, filename="lakeside.zip"))
+        assert pages == [("p1.csv", b"page\n1\n"), ("p2.csv", b"page\n2\n")]
+
+
+@pytest.mark.usefixtures("db")
+class TestLoadingPages:
+    """Writing uploaded pages to the database."""
+
+    def test_entries_written_with_their_addresses(self):
+        """Entries point at their own addresses, across batches, matched to streets."""
+        foster = Street(street_id="FOSTER_00", name="FOSTER", suffix="AVE", text="")
+        foster.save()
+        directory = Directory(name="Lakeside 1911", year=1911, tag="lakeside1911")
+        directory.save()
+        rows = [
+            directory_row(4, "Smith", home="Foster"),
+            directory_row(4, "Jones", home="Fostr", work="Nowhere"),
+            directory_row(5, "Brown", home="Foster"),
+        ]
+
+        report = ingest_page(directory, rows, batch_size=2)
+
+        assert report.entries == 2
+        assert report.errors == [(4, "row is for page '5', not 4")]
+        assert report.warnings == [
+            (3, "home street 'Fostr' taken to be street {}".format(foster.id))
+        ]
+        entries = {entry.last_name: entry for entry in Entry.query}
+        assert set(entries) == {"Smith", "Jones"}
+        smith, jones = entries["Smith"], entries["Jones"]
+        assert smith.home_address.street_name == "Foster"
+        assert smith.home_address.street_id == foster.id
+        assert smith.home_address.match_name == "FOSTER"
+        assert jones.home_address.street_name == "Fostr"
+        assert jones.home_address.street_id == foster.id
+        assert jones.work_address.street_name == "Nowhere"
+        assert jones.work_address.street_id is None
+        assert Address.query.count() == 4
+
+    def test_reloading_replaces_page(self):
+        """Loading a page again replaces its entries and addresses."""
+        directory = Directory(name="Lakeside 1911", year=1911, tag="lakeside1911")
+        directory.save()
+        rows = [directory_row(4, "Smith", home="Foster", work="Clark")]
+
+        ingest_page(directory, rows)
+        ingest_page(directory, rows)
+
+        assert Page.query.count() == 1
+        assert Entry.query.count() == 1
+        assert Address.query.count() == 2
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Street matcher unit tests."""
+from chicagodir.streets.matching import (
+    MATCH_AMBIGUOUS,
+    MATCH_NONE,
+    MATCH_UNIQUE,
+    BKTree,
+    StreetMatcher,
+    StreetRecord,
+)
+
+STREETS = [
+    StreetRecord(1, "FOSTER", "AVE", None, 1880, None),
+    StreetRecord(2, "STATE", "ST", "N", None, None),
+    StreetRecord(3, "STATE", "ST", "S", None, None),
+    StreetRecord(4, "ADAMS", "ST", None, 1850, 1895),
+    StreetRecord(5, "ADAMS", "ST", None, 1896, None),
+    StreetRecord(6, "ELM", "ST", None, None, None),
+    StreetRecord(7, "ELM", "ST", None, None, None),
+    StreetRecord(8, "HALSTED", "ST", None, 1850, None),
+    StreetRecord(9, "HALSEY", "AVE", None, 1870, 1900),
+]
+
+
+class TestStreetMatcher:
+    """Resolving addresses against an in-memory street index."""
+
+    matcher = StreetMatcher(STREETS)
+
+    def test_unique_name(self):
+        """A name only one street has matches it, suffix or not."""
+        match = self.matcher.match("Foster", "Av.", "", 1911)
+        assert match.outcome == MATCH_UNIQUE
+        assert match.street_id == 1
+
+    def test_direction_and_year_disambiguate(self):
+        """Direction, then the directory's year, pick between namesakes."""
+        assert self.matcher.match("State", "St", "S.").street_id == 3
+        assert self.matcher.match("Adams", "St", "", 1890).street_id == 4
+        assert self.matcher.match("Adams", "St", "", 1911).street_id == 5
+
+    def test_ambiguous_and_none(self):
+        """Namesakes that cannot be told apart are reported, as is no match."""
+        match = self.matcher.match("Elm", "St", "", 1911)
+        assert match.outcome == MATCH_AMBIGUOUS
+        assert match.candidates == (6, 7)
+        assert self.matcher.match("Foster", "", "", 1911).outcome == MATCH_UNIQUE
+        assert self.matcher.match("Nowhere", "St").outcome == MATCH_NONE
+        assert self.matcher.match(None).outcome == MATCH_NONE
+
+    def test_fuzzy_names_limited_to_year(self):
+        """A misread name matches the nearest name of a street extant then."""
+        assert self.matcher.match("Halsteao", "St", "", 1911).outcome == MATCH_NONE
+        match = self.matcher.match("Halsteao", "St", "", 1911, fuzzy=True)
+        assert match.street_id == 8
+        assert match.distance == 2
+        assert self.matcher.similar_names("HALSEE") == [(1, "HALSEY"), (2, "HALSTED")]
+        assert self.matcher.similar_names("HALSEE", year=1911) == [(2, "HALSTED")]
+
+
+class TestBKTree:
+    """Searching a BK-tree for near words."""
+
+    def test_search_is_ranked_and_bounded(self):
+        """Every word within the bound is found, nearest first."""
+        tree = BKTree(["STATE", "SLATE", "STATES", "SKATE", "CLARK", "STALE"])
+        assert tree.search("STATE", 1) == [
+            (0, "STATE"),
+            (1, "SKATE"),
+            (1, "SLATE"),
+            (1, "STALE"),
+            (1, "STATES"),
+        ]
+        assert tree.search("CLERK", 0) == []
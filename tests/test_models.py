@@ -4,6 +4,8 @@ import datetime as dt
 
 import pytest
 
+from chicagodir.database import db
+from chicagodir.streets.models import Street, StreetChange, StreetLineage, StreetTag
 from chicagodir.user.models import Role, User
 
 from .factories import UserFactory
@@ -74,3 +76,128 @@ class TestUser:
         """Check __repr__ output for User."""
         user = User(username="foo", email="foo@bar.com")
         assert user.__repr__() == "<User('foo')>"
+
+
+def make_street(name, current=False, **kwargs):
+    """Save a street with the name, for a test."""
+    street = Street(
+        street_id=f"{name}_00", name=name, current=current, text="", **kwargs
+    )
+    street.save()
+    return street
+
+
+def make_change(from_street, to_street):
+    """Save a street change from one street to another."""
+    StreetChange(from_id=from_street.id, to_id=to_street.id).save()
+
+
+@pytest.mark.usefixtures("db")
+class TestStreetLineage:
+    """Street successors and predecessors at any remove."""
+
+    def test_current_successors_stop_at_current_streets(self):
+        """A current street is left out only if every path to it passes another."""
+        old = make_street("OLD")
+        middle = make_street("MIDDLE")
+        renamed = make_street("RENAMED", current=True)
+        merged = make_street("MERGED", current=True)
+        beyond = make_street("BEYOND", current=True)
+        make_change(old, middle)
+        make_change(middle, merged)
+        make_change(old, renamed)
+        make_change(renamed, merged)
+        make_change(renamed, beyond)
+
+        assert old.find_current_successors() == {renamed, merged}
+
+    def test_grid_inheritance_matches_per_street(self):
+        """Inheriting for every street at once agrees with one street at a time."""
+        starts = []
+        for suffix in ("A", "B"):
+            start = make_street(f"START{suffix}")
+            middle = make_street(f"MIDDLE{suffix}")
+            north = make_street(
+                f"NORTH{suffix}", True, grid_direction="N", grid_location=5200
+            )
+            farther = make_street(
+                f"FARTHER{suffix}", True, grid_direction="N", grid_location=5600
+            )
+            south = make_street(
+                f"SOUTH{suffix}", True, grid_direction="S", grid_location=100
+            )
+            make_change(start, middle)
+            make_change(start, north)
+            make_change(middle, farther)
+            make_change(north, farther)
+            make_change(north, south)
+            starts.append(start)
+        one, every = starts
+        one.get_grid_location_from_successors()
+        one.save()
+        Street.inherit_all_grid_locations()
+        db.session.refresh(every)
+
+        assert (one.grid_direction, one.grid_location) == ("N", None)
+        assert (every.grid_direction, every.grid_location) == (
+            one.grid_direction,
+            one.grid_location,
+        )
+
+    def test_rebuild(self):
+        """Rebuilding the lineage finds every predecessor, nearest first."""
+        old = make_street("OLD")
+        middle = make_street("MIDDLE")
+        new = make_street("NEW", current=True)
+        make_change(old, middle)
+        make_change(middle, new)
+        StreetLineage.rebuild()
+
+        assert new.all_predecessors() == [middle, old]
+
+
+@pytest.mark.usefixtures("db")
+class TestSuccessorNames:
+    """Successor names recomputed for every street at once."""
+
+    def test_recalculate_successor_names(self):
+        """A single successor's name is stored; other streets keep theirs."""
+        renamed = make_street("RENAMED", suffix="ST")
+        split = make_street("SPLIT", suffix="ST", successor_name="by hand")
+        foster = make_street("FOSTER", suffix="AVE", current=True)
+        clark = make_street("CLARK", suffix="ST", current=True)
+        make_change(renamed, foster)
+        make_change(split, foster)
+        make_change(split, clark)
+
+        assert Street.recalculate_successor_names() == 1
+        assert Street.get_by_id(renamed.id).successor_name == "Foster Ave"
+        assert Street.get_by_id(split.id).successor_name == "by hand"
+        assert Street.recalculate_successor_names() == 0
+
+
+def tag_counts() -> dict:
+    """The stored count of streets carrying each tag."""
+    return {tag.tag: tag.street_count for tag in StreetTag.query}
+
+
+@pytest.mark.usefixtures("db")
+class TestStreetTags:
+    """Counts of the streets carrying each tag."""
+
+    def test_saving_counts_tags(self):
+        """Saving streets counts the tags they gained."""
+        make_street("FOSTER", tags=["boulevard", "CA3-Uptown"])
+        make_street("CLARK", tags=["boulevard"])
+        assert tag_counts() == {"boulevard": 2, "CA3-Uptown": 1}
+
+    def test_refresh_recounts_and_drops_unused(self):
+        """Refreshing recounts only the tags given, and drops those on no street."""
+        make_street("FOSTER", tags=["boulevard", "CA3-Uptown"])
+        make_street("CLARK", tags=["boulevard"])
+        db.session.execute(
+            db.text("UPDATE streets SET tags = ARRAY['CA4'] WHERE name = 'FOSTER'")
+        )
+        StreetTag.refresh({"boulevard", "CA3-Uptown", "unknown"})
+        db.session.commit()
+        assert tag_counts() == {"boulevard": 1}
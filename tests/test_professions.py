@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Tests of the professions counted in each directory."""
+import pytest
+
+from chicagodir.directory.ingest import ingest_page
+from chicagodir.directory.models import (
+    Directory,
+    ProfessionCount,
+    get_all_jobs,
+    profession_key,
+)
+from chicagodir.streets.matching import StreetMatcher
+
+from .factories import directory_row
+
+
+class TestProfessionKey:
+    """Normalising professions as written."""
+
+    def test_profession_variants_collapse(self):
+        """Professions are counted together whatever their case or abbreviation."""
+        assert profession_key("Clk.") == profession_key(" clerk ") == "CLERK"
+        assert profession_key("Mach. Hand") == "MACHINIST HAND"
+        assert profession_key("") is None
+        assert profession_key(None) is None
+
+
+def profession_counts(directory) -> dict:
+    """The stored count of entries giving each profession in a directory."""
+    return {
+        count.profession: count.entry_count
+        for count in ProfessionCount.query.filter_by(directory_id=directory.id)
+    }
+
+
+@pytest.mark.usefixtures("db")
+class TestProfessionCounts:
+    """Counts kept as pages are loaded."""
+
+    def test_loading_pages_counts_professions(self):
+        """Professions are counted on load, and uncounted when a page is replaced."""
+        directory = Directory(name="Lakeside 1911", year=1911, tag="lakeside1911")
+        directory.save()
+        matcher = StreetMatcher([])
+        rows = [
+            directory_row(4, "Smith", profession="Clk."),
+            directory_row(4, "Jones", profession="clerk"),
+            directory_row(4, "Brown", profession="lab"),
+            directory_row(4, "Green"),
+        ]
+        ingest_page(directory, rows, matcher=matcher)
+        ingest_page(directory, rows[1:], matcher=matcher, batch_size=2)
+
+        assert profession_counts(directory) == {"CLERK": 1, "LABORER": 1}
+        ProfessionCount.rebuild()
+        assert profession_counts(directory) == {"CLERK": 1, "LABORER": 1}
+
+        ingest_page(directory, rows[3:], matcher=matcher)
+        assert profession_counts(directory) == {}
+        assert get_all_jobs(directory.id).all() == []
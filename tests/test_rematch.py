@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Tests of matching loaded directory addresses to streets again."""
+import pytest
+
+from chicagodir.database import db
+from chicagodir.directory.ingest import ingest_page
+from chicagodir.directory.models import Address, Directory, Entry
+from chicagodir.directory.rematch import changed_addresses, rematch_addresses
+from chicagodir.streets.matching import StreetMatcher, StreetRecord
+from chicagodir.streets.models import Street
+
+from .factories import directory_row
+
+
+class TestChangedAddresses:
+    """Working out which addresses a rematch changes."""
+
+    def test_rematch_only_reports_changes(self):
+        """Rematching gives the addresses whose street or key is out of date."""
+        matcher = StreetMatcher([StreetRecord(1, "FOSTER", "AVE", None, None, None)])
+        key = ("FOSTER", "AVE", "N")
+        batch = [
+            (10, "Foster", "Av", "N", 1, 1911, *key),
+            (11, "Foster", "Av", "N", None, 1911, *key),
+            (12, "Fostr", "Av", "N", 2, 1911, "FOSTR", "AVE", "N"),
+            (13, "Nowhere", "St", "", 1, 1911, None, None, None),
+            (14, "Foster", "Av", "N.", 1, 1911, None, None, None),
+        ]
+        matches = {}
+        changes, moved = changed_addresses(batch, matcher, matches)
+        assert changes == {
+            11: (1, key),
+            12: (1, ("FOSTR", "AVE", "N")),
+            13: (None, ("NOWHERE", "ST", None)),
+            14: (1, key),
+        }
+        assert moved == 3
+        assert len(matches) == 4
+
+
+@pytest.mark.usefixtures("db")
+class TestRematchAddresses:
+    """Rematching the addresses stored in the database."""
+
+    def test_rematch_writes_streets_and_keys(self):
+        """Addresses get the street now known, and their key if it was missing."""
+        directory = Directory(name="Lakeside 1911", year=1911, tag="lakeside1911")
+        directory.save()
+        rows = [
+            directory_row(4, "Smith", home="Foster", work="Clark"),
+            directory_row(4, "Jones", home="Fostr"),
+        ]
+        ingest_page(directory, rows, matcher=StreetMatcher([]))
+        foster = Street(street_id="FOSTER_00", name="FOSTER", suffix="AVE", text="")
+        foster.save()
+        db.session.query(Address).filter(Address.street_name == "Clark").update(
+            {Address.match_name: None}, synchronize_session=False
+        )
+        db.session.commit()
+
+        report = rematch_addresses(directory_ids=[directory.id], batch_size=1)
+
+        assert report == {"addresses": 4, "changed": 2}
+        entries = {entry.last_name: entry for entry in Entry.query}
+        assert entries["Smith"].home_address.street_id == foster.id
+        assert entries["Jones"].home_address.street_id == foster.id
+        assert entries["Smith"].work_address.street_id is None
+        assert entries["Smith"].work_address.match_name == "CLARK"
+        assert rematch_addresses(directory_ids=[directory.id]) == {
+            "addresses": 4,
+            "changed": 0,
+        }
+
+    def test_names_near(self):
+        """Names a few OCR errors from a street's are found, others are not."""
+        directory = Directory(name="Lakeside 1911", year=1911, tag="lakeside1911")
+        directory.save()
+        rows = [
+            directory_row(4, "Smith", home="Foster", work="Clark"),
+            directory_row(4, "Jones", home="Fostr", work="Forster"),
+        ]
+        ingest_page(directory, rows, matcher=StreetMatcher([]))
+
+        assert Address.names_near(["Foster"]) == {"FOSTER", "FOSTR", "FORSTER"}
+        assert Address.names_near([]) == set()
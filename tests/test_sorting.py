@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Street sorting unit tests."""
+from collections import namedtuple
+
+from chicagodir.streets.sorting import (
+    natural_sort_string,
+    street_key,
+    street_sort_string,
+)
+
+FakeStreet = namedtuple("FakeStreet", ["name", "suffix", "direction"])
+
+
+class TestSortString:
+    """Stored sort keys."""
+
+    def test_numbers_sort_naturally(self):
+        """Numbered streets sort numerically, not lexically."""
+        assert natural_sort_string("9TH ST") < natural_sort_string("10TH ST")
+
+    def test_prefix_sorts_first(self):
+        """A name sorts before longer names it prefixes."""
+        assert natural_sort_string("ELM ") < natural_sort_string("ELM*")
+        assert natural_sort_string("A1") < natural_sort_string("A B")
+
+    def test_matches_street_key(self):
+        """Sorting by the stored key agrees with sorting by street_key."""
+        streets = [
+            FakeStreet("ASHLAND", "AVE", "N"),
+            FakeStreet("ASHLAND", "AVE", "S"),
+            FakeStreet("ASHLAND", "BLVD", None),
+            FakeStreet("100TH", "ST", "E"),
+            FakeStreet("11TH", "PL", "W"),
+            FakeStreet("1ST", "AVE", None),
+            FakeStreet("** new street **", "", None),
+            FakeStreet("LA SALLE", "ST", "N"),
+            FakeStreet("LASALLE", "DR", None),
+        ]
+        by_key = sorted(streets, key=street_key)
+        by_string = sorted(streets, key=lambda s: street_sort_string(s).encode())
+        assert by_key == by_string
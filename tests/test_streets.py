@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Street model unit tests that do not need a database."""
+import io
+
+import geopandas as gpd
+import matplotlib.pyplot as plt
+from geoalchemy2.shape import from_shape
+from shapely.geometry import LineString, box
+from sqlalchemy import inspect
+from sqlalchemy.orm.attributes import set_committed_value
+
+from chicagodir.extensions import cache
+from chicagodir.streets import geodata, maps
+from chicagodir.streets.geodata import cached_geodata, invalidate_geodata
+from chicagodir.streets.models import (
+    Street,
+    bump_edit_generation,
+    changed_array_items,
+    edit_generation,
+)
+from chicagodir.streets.views import cached_page
+
+
+class TestSnapshots:
+    """Per-year street snapshots."""
+
+    def test_bump_edit_generation(self, app):
+        """Bumping the edit generation increments it."""
+        before = edit_generation()
+        bump_edit_generation()
+        assert edit_generation() == before + 1
+
+    def test_cached_snapshot_is_used(self, app):
+        """A snapshot cached for this generation is returned as is."""
+        cache.set("streets/extant/1911/{}".format(edit_generation()), [1, 2, 3])
+        assert Street.street_ids_given_year(1911) == [1, 2, 3]
+
+
+class TestGeodataCache:
+    """Process-level geodata kept between map jobs."""
+
+    def test_loaded_once_until_invalidated(self, app):
+        """Geodata is loaded on first use, and again only after invalidation."""
+        loads = []
+
+        def load():
+            loads.append(1)
+            return len(loads)
+
+        assert cached_geodata("test", load) == 1
+        assert cached_geodata("test", load) == 1
+        invalidate_geodata()
+        assert cached_geodata("test", load) == 2
+
+
+class TestBasemaps:
+    """Maps drawn over a basemap rendered once per year of city limits."""
+
+    def test_years_share_city_limits_basemap(self, app, monkeypatch, tmp_path):
+        """Years with the same city limits share one basemap of the map's size."""
+        areas = gpd.GeoDataFrame(
+            {"id": [1, 2]}, geometry=[box(0, 0, 10, 10), box(10, 0, 20, 12)]
+        )
+        limits = gpd.GeoDataFrame(
+            {"year": [1850, 1900]}, geometry=[box(2, 2, 8, 8), box(0, 0, 20, 12)]
+        )
+        monkeypatch.setattr(geodata, "load_areas", lambda: areas)
+        monkeypatch.setattr(geodata, "load_all_city_limits", lambda: limits)
+        monkeypatch.setattr(maps, "BASEMAP_DIR", str(tmp_path))
+        invalidate_geodata()
+
+        extent = maps.map_extent()
+        assert maps.basemap_path(extent, 1870) == maps.basemap_path(extent, 1880)
+        assert maps.basemap_path(extent, 1870) != maps.basemap_path(extent, 1910)
+        fig, ax = maps.street_map(1870)
+        gpd.GeoSeries([LineString([(1, 1), (19, 11)])]).plot(ax=ax)
+        assert (ax.get_xlim(), ax.get_ylim()) == (extent[:2], extent[2:])
+        image = io.BytesIO()
+        maps.save_map(fig, image, "a street")
+        image.seek(0)
+        basemap = plt.imread(maps.basemap_path(extent, 1870))
+        assert plt.imread(image).shape == basemap.shape
+
+
+class TestStreetGeometries:
+    """Fetching the geometry of many streets to plot at once."""
+
+    def test_stale_geometry_derived_on_the_spot(self, app, monkeypatch):
+        """Stored geometries are used as is, stale ones worked out, missing ones dropped."""
+        stored = gpd.GeoDataFrame(
+            {"id": [1, 2, 3], "stale": [False, True, False]},
+            geometry=[LineString([(0, 0), (1, 1)]), None, None],
+        )
+        monkeypatch.setattr(maps, "load_street_geometries", lambda ids: stored)
+        street = Street(id=2, derived_geom=from_shape(LineString([(2, 2), (3, 3)])))
+        street.geom = street.derived_geom
+        monkeypatch.setattr(Street, "get_by_id", classmethod(lambda cls, _: street))
+
+        geometries = maps.street_geometries([1, 2, 3])
+        assert [geometry.wkt for geometry in geometries] == [
+            "LINESTRING (0 0, 1 1)",
+            "LINESTRING (2 2, 3 3)",
+        ]
+
+
+class TestTagCounts:
+    """Working out which tag counts a save affects."""
+
+    def test_only_changed_tags(self, app):
+        """Tags kept through an edit are not recounted."""
+        street = Street(name="FOSTER")
+        set_committed_value(street, "tags", ["CA3-Uptown", "boulevard"])
+        street.tags = ["CA3-Uptown", "CA4-Lincoln Square"]
+        assert changed_array_items(inspect(street).attrs.tags.history) == {
+            "boulevard",
+            "CA4-Lincoln Square",
+        }
+
+
+class TestCachedPages:
+    """Conditional, cached public pages."""
+
+    def test_repeat_render_is_cached(self, app):
+        """A page is rendered once, then served from the cache."""
+        renders = []
+
+        def render():
+            renders.append(1)
+            return "<p>street</p>"
+
+        first = cached_page("street/test", None, render)
+        second = cached_page("street/test", None, render)
+        assert second.get_data(as_text=True) == "<p>street</p>"
+        assert first.get_etag() == second.get_etag()
+        assert len(renders) == 1
+
+    def test_matching_etag_gets_304(self, app):
+        """A client holding the current version is not sent it again."""
+        etag, _ = cached_page("street/test", None, lambda: "x").get_etag()
+        with app.test_request_context(headers={"If-None-Match": f'"{etag}"'}):
+            response = cached_page("street/test", None, lambda: "x")
+            assert response.status_code == 304
+
+    def test_edit_changes_etag(self, app):
+        """Bumping the edit generation retires the ETag."""
+        before = cached_page("street/test", None, lambda: "x").get_etag()
+        bump_edit_generation()
+        assert cached_page("street/test", None, lambda: "x").get_etag() != before